@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import asyncio
+
+from batch import solve_many
+from solver import *
+
+# Solving for asyncio code. The solves run in an executor, so the event loop
+# is never blocked. Queries for the same position, up to whole-cube
+# rotation, share one solve while it is in flight, and the queries made
+# within batch_delay seconds of each other are solved together in a single
+# executor call of up to batch_size states. With no distance table the
+# states are solved by IDAStarSolver.
+class AsyncSolver:
+  def __init__(self, distance_table=None, executor=None, batch_size=256,
+               batch_delay=0.001):
+    Rotator.init()
+    Corners.init()
+    MoveTables.init()
+    if distance_table is None:
+      PatternDatabases.init()
+    self._distance_table = distance_table
+    self._executor = executor
+    self._batch_size = batch_size
+    self._batch_delay = batch_delay
+    self._queries = {}
+    self._pending = {}
+    self._timer = None
+    self._tasks = set()
+    self._batches = 0
+    self._coalesced = 0
+
+  # Raises asyncio.TimeoutError after timeout seconds. A query that times
+  # out or is cancelled leaves the solve to the others waiting for it, and
+  # drops it if nobody is left and it has not been started.
+  async def solve(self, state, timeout=None):
+    (canonical_state, rank, sides) = state.canonical_form()
+    query = self._queries.get(rank)
+    if query is None:
+      query = _Query(asyncio.get_running_loop().create_future(),
+                     canonical_state)
+      self._queries[rank] = query
+      self._pending[rank] = query
+      if len(self._pending) >= self._batch_size:
+        self._flush()
+      elif self._timer is None:
+        self._timer = asyncio.get_running_loop().call_later(
+          self._batch_delay, self._flush)
+    else:
+      self._coalesced += 1
+    query.waiters += 1
+    try:
+      solution = await asyncio.wait_for(asyncio.shield(query.future),
+                                        timeout)
+    finally:
+      query.waiters -= 1
+      if query.waiters == 0 and not query.future.done():
+        query.future.cancel()
+        self._pending.pop(rank, None)
+        if self._queries.get(rank) is query:
+          del self._queries[rank]
+    if solution is None:
+      return None
+    return Turn.remap(solution, sides)
+
+  def batch_count(self):
+    return self._batches
+
+  def coalesced_count(self):
+    return self._coalesced
+
+  def _flush(self):
+    if self._timer is not None:
+      self._timer.cancel()
+      self._timer = None
+    if not self._pending:
+      return
+    batch = list(self._pending.items())
+    self._pending = {}
+    self._batches += 1
+    task = asyncio.ensure_future(self._run(batch))
+    self._tasks.add(task)
+    task.add_done_callback(self._tasks.discard)
+
+  async def _run(self, batch):
+    states = [query.state for (rank, query) in batch]
+    try:
+      solutions = await asyncio.get_running_loop().run_in_executor(
+        self._executor, self._solve_batch, states)
+    except Exception as e:
+      for (rank, query) in batch:
+        if not query.future.done():
+          query.future.set_exception(e)
+    else:
+      for ((rank, query), solution) in zip(batch, solutions):
+        if not query.future.done():
+          query.future.set_result(solution)
+    finally:
+      for (rank, query) in batch:
+        if self._queries.get(rank) is query:
+          del self._queries[rank]
+
+  def _solve_batch(self, states):
+    return [solution for (index, solution)
+            in solve_many(states, self._distance_table)]
+
+class _Query:
+  def __init__(self, future, state):
+    self.future = future
+    self.state = state
+    self.waiters = 0
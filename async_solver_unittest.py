@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+import time
+import unittest
+
+from solver import *
+
+# async_solver needs Python 3, so these tests are written without async
+# syntax and are skipped where it cannot be imported.
+try:
+  import asyncio
+  from async_solver import *
+except (ImportError, SyntaxError):
+  asyncio = None
+
+@unittest.skipIf(asyncio is None, 'asyncio needs Python 3')
+class AsyncSolverTestCaseBase(unittest.TestCase):
+  def setUp(self):
+    Rotator.init()
+    self._table = DistanceTable.build(max_depth=3)
+    self._state = Solver.solved_state().apply(
+      Turn(Side.FRONT, Turn.T90)).apply(Turn(Side.UPPER, Turn.T90)).apply(
+      Turn(Side.RIGHT, Turn.T180))
+    self._loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(self._loop)
+
+  def tearDown(self):
+    asyncio.set_event_loop(None)
+    self._loop.close()
+
+  def _gather(self, coroutines, return_exceptions=False):
+    return self._loop.run_until_complete(
+      asyncio.gather(*coroutines, return_exceptions=return_exceptions))
+
+class CoalescingTestCase(AsyncSolverTestCaseBase):
+  def runTest(self):
+    solver = AsyncSolver(self._table)
+    states = self._state.get_equivalents() + [Solver.solved_state()]
+    results = self._gather([solver.solve(state) for state in states])
+    assert solver.batch_count() == 1
+    assert solver.coalesced_count() == 23
+    assert results[-1] == []
+    for (state, result) in zip(states, results[:-1]):
+      assert len(result) == 3
+      for turn in result:
+        state = state.apply(turn)
+      assert Solver.solved_state() in state.get_equivalents()
+    solver = AsyncSolver(self._table, batch_size=2)
+    f_state = Solver.solved_state().apply(Turn(Side.FRONT, Turn.T90))
+    results = self._gather(
+      [solver.solve(state)
+       for state in [self._state, Solver.solved_state(), f_state] * 2])
+    assert [len(result) for result in results] == [3, 0, 1] * 2
+    assert solver.batch_count() == 2
+    assert solver.coalesced_count() == 3
+    results = self._gather([AsyncSolver().solve(self._state)])
+    assert len(results[0]) == 3
+
+class TimeoutTestCase(AsyncSolverTestCaseBase):
+  def runTest(self):
+    class SlowAsyncSolver(AsyncSolver):
+      def _solve_batch(self, states):
+        time.sleep(0.2)
+        return AsyncSolver._solve_batch(self, states)
+    solver = SlowAsyncSolver(self._table)
+    (timed_out, result) = self._gather(
+      [solver.solve(self._state, timeout=0.01), solver.solve(self._state)],
+      return_exceptions=True)
+    assert isinstance(timed_out, asyncio.TimeoutError)
+    assert len(result) == 3
+    solver = AsyncSolver(self._table, batch_delay=10)
+    task = self._loop.create_task(solver.solve(self._state))
+    self._loop.run_until_complete(asyncio.sleep(0))
+    task.cancel()
+    (cancelled,) = self._gather([task], return_exceptions=True)
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert (len(solver._pending), len(solver._queries)) == (0, 0)
+    assert solver.batch_count() == 0
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import multiprocessing
+
+from solver import *
+
+# Solves each state in turn, yielding (index, solution) pairs. The move
+# tables and pattern databases are built once per process and shared by all
+# the states; with a distance table every solve is a walk down the table.
+def solve_many(states, distance_table=None):
+  Rotator.init()
+  for (index, state) in enumerate(states):
+    if distance_table:
+      yield (index, distance_table.solve(state))
+    else:
+      yield (index, IDAStarSolver(state).solve())
+
+# Like solve_many, but spreads the states over a pool of worker processes in
+# chunks of chunk_size. Each worker maps the table file written by
+# DistanceTable.save, so all of them share one copy of its pages. Results
+# are yielded in input order.
+def solve_many_parallel(states, table_path=None, processes=None,
+                        chunk_size=256):
+  pool = multiprocessing.Pool(processes, _init_worker, (table_path,))
+  try:
+    results = pool.imap(_solve, states, chunk_size)
+    for (index, result) in enumerate(results):
+      yield (index, result)
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
+
+_distance_table = None
+
+def _init_worker(table_path):
+  global _distance_table
+  Rotator.init()
+  if table_path:
+    _distance_table = DistanceTable.load(table_path)
+
+def _solve(state):
+  if _distance_table:
+    return _distance_table.solve(state)
+  return IDAStarSolver(state).solve()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from batch import *
+
+class SolveManyTestCase(unittest.TestCase):
+  def setUp(self):
+    Rotator.init()
+    initial_state = Solver.solved_state()
+    f_state = initial_state.apply(Turn(Side.FRONT, Turn.T90))
+    fu_state = f_state.apply(Turn(Side.UPPER, Turn.T90))
+    self._states = [fu_state, initial_state, f_state.get_equivalents()[3]]
+
+  def runTest(self):
+    for table in (None, DistanceTable.build(max_depth=2)):
+      results = list(solve_many(iter(self._states), table))
+      assert [index for (index, result) in results] == [0, 1, 2]
+      assert [len(result) for (index, result) in results] == [2, 0, 1]
+
+class SolveManyParallelTestCase(SolveManyTestCase):
+  def runTest(self):
+    directory = tempfile.mkdtemp()
+    try:
+      path = os.path.join(directory, 'tables.bin')
+      DistanceTable.build(max_depth=2).save(path)
+      for table_path in (None, path):
+        results = list(solve_many_parallel(
+          self._states * 3, table_path, processes=2, chunk_size=2))
+        assert [index for (index, result) in results] == list(range(9))
+        assert [len(result) for (index, result) in results] == [2, 0, 1] * 3
+    finally:
+      shutil.rmtree(directory)
+
+if __name__ == "__main__":
+  unittest.main()
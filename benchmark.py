@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from solver import *
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+# Best wall time of running the statement in a fresh interpreter, less the
+# time of starting one that does nothing. None if the statement fails, as
+# importing euclid does on Python 3.
+def startup_time(statement, runs=10):
+  try:
+    run_time = _best_run_time(statement, runs)
+  except subprocess.CalledProcessError:
+    return None
+  return run_time - _best_run_time('pass', runs)
+
+def _best_run_time(statement, runs):
+  directory = os.path.dirname(os.path.abspath(__file__))
+  best = None
+  for i in range(runs):
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+      subprocess.check_call([sys.executable, '-c', statement], cwd=directory,
+                            stderr=devnull)
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+def startup_report(runs=10):
+  statements = [
+    ('import_solver', 'import solver'),
+    ('init_solver', 'import solver; solver.Rotator.init()'),
+    ('import_solver_and_euclid', 'import solver, euclid'),
+  ]
+  report = {}
+  for (name, statement) in statements:
+    seconds = startup_time(statement, runs)
+    report[name] = None if seconds is None else round(seconds * 1000, 2)
+  return report
+
+ENGINES = ['distance_table', 'symmetric_table', 'ida_star', 'bidirectional',
+           'bfs']
+MAX_DEPTH = 11
+
+# Up to samples positions at each optimal distance from 0 to MAX_DEPTH,
+# as (depth, rank, rotation) with rotation an index into get_equivalents().
+# The same seed always gives the same positions. Also returns the time the
+# distance table they are drawn from took to build.
+def scrambles(samples, seed=0):
+  start = _timer()
+  table = _distance_table()
+  build_time = _timer() - start
+  generator = random.Random(seed)
+  # A reservoir of samples ranks per depth: the n-th rank met at a depth
+  # replaces a random one of them with probability samples / n.
+  reservoirs = [[] for depth in range(MAX_DEPTH + 1)]
+  counts = [0] * (MAX_DEPTH + 1)
+  for (rank, depth) in enumerate(table._distances):
+    counts[depth] += 1
+    reservoir = reservoirs[depth]
+    if len(reservoir) < samples:
+      reservoir.append(rank)
+    elif generator.random() * counts[depth] < samples:
+      reservoir[int(generator.random() * samples)] = rank
+  result = []
+  for (depth, ranks) in enumerate(reservoirs):
+    for rank in sorted(ranks):
+      result.append((depth, rank, generator.randrange(24)))
+  return (result, build_time)
+
+# Runs the engine on each scramble in a fresh interpreter, so that the peak
+# RSS is that of the engine alone and not of the pages of this process.
+def engine_report(engine, scrambles):
+  process = subprocess.Popen(
+    [sys.executable, os.path.abspath(__file__), '--run-engine', engine],
+    stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+  (output, errors) = process.communicate(
+    json.dumps(scrambles).encode('ascii'))
+  if process.returncode != 0:
+    raise RuntimeError('engine %s exited with status %d' %
+                       (engine, process.returncode))
+  return json.loads(output.decode('ascii'))
+
+def _run_engine(engine, scrambles):
+  Rotator.init()
+  start = _timer()
+  solve = _engine(engine)
+  setup_time = _timer() - start
+  latencies = [[] for depth in range(MAX_DEPTH + 1)]
+  nodes = [[] for depth in range(MAX_DEPTH + 1)]
+  wrong = 0
+  for (depth, rank, rotation) in scrambles:
+    state = State.from_rank(rank).get_equivalents()[rotation]
+    start = _timer()
+    (solution, generated) = solve(state)
+    latencies[depth].append(_timer() - start)
+    if generated is not None:
+      nodes[depth].append(generated)
+    for turn in solution:
+      state = state.apply(turn)
+    if len(solution) != depth or \
+       not Solver.solved_state() in state.get_equivalents():
+      wrong += 1
+  depths = [dict(_summary(latencies[depth], nodes[depth]), depth=depth)
+            for depth in range(MAX_DEPTH + 1) if latencies[depth]]
+  return {'setup_s': round(setup_time, 3), 'depths': depths,
+          'wrong_solutions': wrong,
+          'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+# Returns a function from a state to its solution and the number of states
+# generated finding it, if the engine counts them.
+def _engine(engine):
+  if engine == 'distance_table':
+    table = _distance_table()
+    return lambda state: (table.solve(state), None)
+  if engine == 'symmetric_table':
+    table = SymmetricDistanceTable.build()
+    return lambda state: (table.solve(state), None)
+  if engine == 'ida_star':
+    PatternDatabases.init()
+    solver_class = IDAStarSolver
+  elif engine == 'bidirectional':
+    MoveTables.init()
+    solver_class = lambda state: Solver(state, bidirectional=True)
+  elif engine == 'bfs':
+    MoveTables.init()
+    solver_class = Solver
+  else:
+    raise ValueError('unknown engine: %s' % (engine,))
+  def solve(state):
+    solver = solver_class(state)
+    return (solver.solve(), solver.generated_count())
+  return solve
+
+def _distance_table():
+  try:
+    return DistanceTable.build_vectorized()
+  except ImportError:
+    return DistanceTable.build()
+
+def _summary(latencies, nodes):
+  latencies = sorted(latencies)
+  summary = dict(('p%d_ms' % (p,), round(_percentile(latencies, p) * 1000, 3))
+                 for p in (50, 90, 99))
+  summary['max_ms'] = round(latencies[-1] * 1000, 3)
+  summary['count'] = len(latencies)
+  if nodes:
+    summary['mean_nodes'] = round(float(sum(nodes)) / len(nodes), 1)
+  return summary
+
+# Nearest-rank percentile of sorted values.
+def _percentile(values, p):
+  return values[max(0, (len(values) * p + 99) // 100 - 1)]
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--samples', type=int, default=10,
+                      help='positions per optimal distance')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--engines', default=','.join(ENGINES),
+                      help='comma-separated engines out of %s' %
+                      (', '.join(ENGINES),))
+  parser.add_argument('--skip-startup', action='store_true',
+                      help='do not time interpreter startup')
+  # Used by engine_report: reads the scrambles from stdin as JSON and
+  # writes the report of one engine to stdout.
+  parser.add_argument('--run-engine', help=argparse.SUPPRESS)
+  args = parser.parse_args()
+  if args.run_engine:
+    report = _run_engine(args.run_engine, json.load(sys.stdin))
+    print(json.dumps(report, sort_keys=True))
+    sys.exit(0)
+  (positions, build_time) = scrambles(args.samples, args.seed)
+  report = {
+    'seed': args.seed,
+    'samples': args.samples,
+    'table_build_s': round(build_time, 3),
+    'engines': dict((engine, engine_report(engine, positions))
+                    for engine in args.engines.split(',')),
+  }
+  if not args.skip_startup:
+    report['startup_ms'] = startup_report()
+  print(json.dumps(report, sort_keys=True))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import threading
+
+try:
+  import socketserver
+except ImportError:
+  import SocketServer as socketserver
+
+from solver import *
+
+# A long-running solver that keeps its tables in memory and answers over a
+# Unix domain socket or localhost TCP. Each request is a line of 24 colour
+# letters, the stickers in the order State takes them, and each answer is a
+# line of "OK" and the turns, or of "ERR" and the reason. Clients may send
+# many lines before reading, and answers come back in the same order.
+
+COLORS = {'W': Color.WHITE, 'R': Color.RED, 'G': Color.GREEN,
+          'Y': Color.YELLOW, 'O': Color.ORANGE, 'B': Color.BLUE}
+
+# Raises ValueError for anything but a cube that turns can solve.
+def parse_state(line):
+  letters = ''.join(line.split()).upper()
+  if len(letters) != Side.LAST * Tile.LAST:
+    raise ValueError('expected %d colours, got %d' %
+                     (Side.LAST * Tile.LAST, len(letters)))
+  try:
+    state = State([COLORS[letter] for letter in letters])
+  except KeyError as e:
+    raise ValueError('unknown colour %r' % (e.args[0],))
+  state.to_rank()
+  return state
+
+def format_solution(turns):
+  return ' '.join(['OK'] + [repr(turn) for turn in turns])
+
+# The address is a path for a Unix domain socket or a (host, port) pair.
+def make_server(address, distance_table, cache_size=4096):
+  Rotator.init()
+  Corners.init()
+  MoveTables.init()
+  if isinstance(address, tuple):
+    server = _TCPServer(address, _Handler)
+  else:
+    server = _UnixServer(address, _Handler)
+  server.distance_table = distance_table
+  server.cache = SolutionCache(cache_size)
+  server.lock = threading.Lock()
+  return server
+
+class _Handler(socketserver.BaseRequestHandler):
+  # Answers every complete line of a read with a single write, so that
+  # pipelined requests cost one round of system calls per read. Bytes
+  # that are not ASCII come back escaped in the error they cause.
+  def handle(self):
+    pending = b''
+    while True:
+      data = self.request.recv(65536)
+      if not data:
+        break
+      lines = (pending + data).split(b'\n')
+      pending = lines.pop()
+      self.request.sendall(b''.join(
+        (self._answer(line.decode('ascii', 'replace')) + '\n').encode(
+          'ascii', 'backslashreplace')
+        for line in lines))
+
+  def _answer(self, line):
+    server = self.server
+    try:
+      state = parse_state(line)
+      # The cache is shared by the threads of all the connections.
+      with server.lock:
+        turns = Solver(state, distance_table=server.distance_table,
+                       cache=server.cache).solve()
+    except ValueError as e:
+      return 'ERR %s' % (e,)
+    if turns is None:
+      return 'ERR no solution'
+    return format_solution(turns)
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+  allow_reuse_address = True
+  daemon_threads = True
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  daemon_threads = True
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--socket', default='solver.sock',
+                      help='path of the Unix domain socket to listen on')
+  parser.add_argument('--port', type=int,
+                      help='listen on this localhost TCP port instead')
+  parser.add_argument('--table', default='tables.bin',
+                      help='distance table file, built if missing')
+  args = parser.parse_args()
+  table = DistanceTable.load_or_build(args.table)
+  if args.port is not None:
+    server = make_server(('127.0.0.1', args.port), table)
+  else:
+    if os.path.exists(args.socket):
+      os.remove(args.socket)
+    server = make_server(args.socket, table)
+  try:
+    server.serve_forever()
+  finally:
+    server.server_close()
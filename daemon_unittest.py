@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from daemon import *
+
+class DaemonTestCase(unittest.TestCase):
+  def setUp(self):
+    Rotator.init()
+    self._dir = tempfile.mkdtemp()
+    self._table = DistanceTable.build(max_depth=3)
+    initial_state = Solver.solved_state()
+    f_state = initial_state.apply(Turn(Side.FRONT, Turn.T90))
+    fu_state = f_state.apply(Turn(Side.UPPER, Turn.T90))
+    self._states = [fu_state, initial_state, f_state.get_equivalents()[3]]
+    # The right colours, but one corner twisted in place.
+    Corners.init()
+    (a, b, c) = Corners._stickers[0]
+    twisted = list(fu_state._state)
+    (twisted[a], twisted[b], twisted[c]) = (twisted[b], twisted[c], twisted[a])
+    self._twisted_state = State(twisted)
+
+  def tearDown(self):
+    shutil.rmtree(self._dir)
+
+  def _line(self, state):
+    letters = dict((color, letter) for (letter, color) in COLORS.items())
+    return ''.join(letters[color] for color in state._state)
+
+  def _check(self, server, connect):
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+      lines = [self._line(state) for state in self._states] + [
+        'WWWW', 'XXXXXXXXXXXXXXXXXXXXXXXX', 'W' * 24,
+        self._line(self._twisted_state)]
+      # Every request but the last is answered after one that is not ASCII.
+      requests = [line.encode('ascii') for line in lines] + [
+        b'W' * 23 + b'\xc3']
+      clients = [connect() for i in range(4)]
+      for client in clients:
+        client.sendall(b'\n'.join(requests * 10) + b'\n')
+        client.shutdown(socket.SHUT_WR)
+      for client in clients:
+        answers = client.makefile('rb').read().decode('ascii').splitlines()
+        assert len(answers) == len(requests) * 10
+        answers = answers[:len(requests)]
+        assert [len(answer.split()) for answer in answers[:3]] == [3, 1, 2]
+        assert all(answer.startswith('OK') for answer in answers[:3])
+        assert all(answer.startswith('ERR ') for answer in answers[3:])
+        assert answers[-2] != 'ERR no solution'
+        assert answers[-1].startswith('ERR unknown colour')
+        client.close()
+    finally:
+      server.shutdown()
+      server.server_close()
+      thread.join()
+
+  def runTest(self):
+    path = os.path.join(self._dir, 'solver.sock')
+    def connect_unix():
+      client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      client.connect(path)
+      return client
+    self._check(make_server(path, self._table), connect_unix)
+    server = make_server(('127.0.0.1', 0), self._table)
+    address = server.server_address
+    def connect_tcp():
+      return socket.create_connection(address)
+    self._check(server, connect_tcp)
+
+if __name__ == "__main__":
+  unittest.main()
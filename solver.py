@@ -1,10 +1,16 @@
 #!/usr/bin/env python
 
-from collections import deque
+from array import array
+import bisect
+import collections
+import ctypes
 import math
+import mmap
+import os
+import struct
+import sys
 import time
-
-from euclid import *
+import zlib
 
 class Color:
   WHITE = 0
@@ -47,9 +53,26 @@ class Turn:
   LAST = T270 + 1
   RADIANS = (math.pi / 2, math.pi, math.pi / -2)
 
+  COUNT = Side.LAST * LAST
+  # Move codes list the sides of Side.minimal_list() first, so the codes of
+  # the turns that the solvers use are 0..8, and the opposite side of the
+  # side with code c has code c + 9.
+  _SIDES = (Side.FRONT, Side.UPPER, Side.RIGHT,
+            Side.BACK, Side.DOWN, Side.LEFT)
+  INVERSE = [c - c % 3 + 2 - c % 3 for c in range(COUNT)]
+
   def __init__(self, side, angle):
     self._side = side
     self._angle = angle
+    self._code = Turn._SIDES.index(side) * Turn.LAST + angle
+
+  # Turns are immutable, so the solvers share these interned ones.
+  @staticmethod
+  def from_code(code):
+    return Turn._TURNS[code]
+
+  def code(self):
+    return self._code
 
   def side(self):
     return self._side
@@ -58,18 +81,38 @@ class Turn:
     return self._angle
 
   def reverse(self):
-    if self._angle == Turn.T180:
-      return self
-    if self._angle == Turn.T90:
-      return Turn(self._side, Turn.T270)
-    else:
-      return Turn(self._side, Turn.T90)
+    return Turn._TURNS[Turn.INVERSE[self._code]]
+
+  # The turns with side s turned into side sides[s], as canonical_form()
+  # of a state gives them for the turns of its canonical() state.
+  @staticmethod
+  def remap(turns, sides):
+    moves = [Turn._SIDES.index(sides[side]) * Turn.LAST
+             for side in Turn._SIDES]
+    return [Turn._TURNS[moves[t._code // Turn.LAST] + t._angle]
+            for t in turns]
+
+  def __hash__(self):
+    return self._code
+
+  def __eq__(self, other):
+    if not isinstance(other, Turn):
+      return NotImplemented
+    return self._code == other._code
+
+  def __ne__(self, other):
+    if not isinstance(other, Turn):
+      return NotImplemented
+    return self._code != other._code
 
   def __repr__(self):
     sides = ['F', 'L', 'U', 'B', 'R', 'D']
     angles = ['', '2', '\'']
     return ('%s%s' % (sides[self._side], angles[self._angle]))
 
+Turn._TURNS = [Turn(side, angle) for side in Turn._SIDES
+               for angle in range(Turn.FIRST, Turn.LAST)]
+
 class State:
   def __init__(self, tiles_by_sides_6_x_4):
     self._state = tuple(tiles_by_sides_6_x_4)
@@ -80,42 +123,115 @@ class State:
     return True
 
   def get_equivalents(self):
-    _X = Rotator.X
-    _Y = Rotator.Y
-    _Z = Rotator.Z
-    _C = Turn.T90
-    _C2 = Turn.T180
-    _CC = Turn.T270
-    return [
-      self._rotate_cube(()),
-      self._rotate_cube(((_Z, _C), (_Y, _C))),
-      self._rotate_cube(((_Z, _CC), (_Y, _CC))),
-      self._rotate_cube(((_Z, _CC),)),
-      self._rotate_cube(((_Y, _C),)),
-      self._rotate_cube(((_Z, _C2), (_X, _C))),
-      self._rotate_cube(((_Z, _C2),)),
-      self._rotate_cube(((_X, _CC), (_Z, _C))),
-      self._rotate_cube(((_Y, _C), (_Z, _CC))),
-      self._rotate_cube(((_Z, _C),)),
-      self._rotate_cube(((_X, _CC),)),
-      self._rotate_cube(((_Z, _C2), (_Y, _CC))),
-      self._rotate_cube(((_Y, _CC),)),
-      self._rotate_cube(((_X, _C),)),
-      self._rotate_cube(((_Y, _C2), (_Z, _C))),
-      self._rotate_cube(((_Z, _C), (_Y, _CC))),
-      self._rotate_cube(((_Z, _C), (_X, _CC))),
-      self._rotate_cube(((_X, _C2),)),
-      self._rotate_cube(((_Z, _C2), (_X, _CC))),
-      self._rotate_cube(((_Z, _C2), (_Y, _C))),
-      self._rotate_cube(((_Y, _C2), (_Z, _CC))),
-      self._rotate_cube(((_Y, _CC), (_Z, _CC))),
-      self._rotate_cube(((_Y, _C2),)),
-      self._rotate_cube(((_Z, _CC), (_Y, _C)))
-    ]
+    return [self._rotate_cube(r) for r in Rotator._FULL_ROTATIONS]
+
+  # The state seen through each of the 48 symmetries of the cube, with the
+  # colours renamed to match, in the order of Symmetries.conjugates.
+  def conjugates(self):
+    Symmetries.init()
+    return [State([colors[self._state[x]] for x in transpose])
+            for (transpose, colors) in Symmetries._symmetries]
+
+  # The whole-cube rotation of the state that has the DLB cubie in place.
+  def canonical(self):
+    return State(Rotator._rotate(self._canonical_transpose(), self._state))
+
+  # The canonical() state, its rank and the side of this state that each
+  # of its sides comes from: turning side s of canonical() turns side
+  # sides[s] here.
+  def canonical_form(self):
+    transpose = self._canonical_transpose()
+    state = State(Rotator._rotate(transpose, self._state))
+    return (state, Corners.index(state._state), State._sides(transpose))
+
+  # The whole-cube rotation of the state that has the same cubie as other
+  # in the DLB slot, the only one that F, U and R turns of other can reach.
+  def aligned_to(self, other):
+    Corners.init()
+    (a, b, c) = Corners._stickers[-1]
+    key = (other._state[a], other._state[b], other._state[c])
+    for (transpose, (ta, tb, tc)) in Corners._dlb_sources:
+      if (self._state[ta], self._state[tb], self._state[tc]) == key:
+        return State(Rotator._rotate(transpose, self._state))
+    raise ValueError('%r has no cubie like the DLB one of %r' % (self, other))
+
+  # The state with colours renamed so that its DLB cubie is in place. Turns
+  # lead it to the solved state exactly when they lead this state to a
+  # whole-cube rotation of the solved state.
+  def anchored(self):
+    Corners.init()
+    if Corners.is_anchored(self._state):
+      return self
+    return self.recolored(self.anchoring_colors())
+
+  # The new colour of each colour in anchored().
+  def anchoring_colors(self):
+    solved_state = Solver.solved_state()
+    colors = [None] * Color.LAST
+    for (color, new_color) in zip(solved_state.aligned_to(self)._state,
+                                  solved_state._state):
+      colors[color] = new_color
+    return colors
+
+  def recolored(self, colors):
+    return State([colors[c] for c in self._state])
+
+  # The state with every sticker renamed to the colour that the solved
+  # state has where final_state has that sticker. Turns and rotations move
+  # stickers without looking at their names, so they lead it to the solved
+  # state exactly when they lead this state to final_state.
+  def relative_to(self, final_state):
+    Corners.init()
+    solved_state = Solver.solved_state()
+    names = {}
+    for positions in Corners._stickers:
+      colors = tuple(final_state._state[pos] for pos in positions)
+      for pos in positions:
+        names[(frozenset(colors), final_state._state[pos])] = \
+          solved_state._state[pos]
+    result = list(self._state)
+    for positions in Corners._stickers:
+      cubie = frozenset(self._state[pos] for pos in positions)
+      for pos in positions:
+        try:
+          result[pos] = names[(cubie, self._state[pos])]
+        except KeyError:
+          raise ValueError('%r and %r have different cubies' %
+                           (self, final_state))
+    return State(result)
+
+  # Whole-cube rotations of a position share its rank.
+  def to_rank(self):
+    return Corners.index(self.canonical()._state)
+
+  @staticmethod
+  def from_rank(rank):
+    if not 0 <= rank < Corners.POSITIONS:
+      raise ValueError('rank out of range: %r' % (rank,))
+    Corners.init()
+    return State(Corners.stickers(rank))
 
+  # A turn of a B, D or L side is the same turn of the opposite side
+  # followed by the whole-cube rotation that takes that side back.
   def apply(self, turn):
-    axis = [Rotator.X, None, Rotator.Z, None, Rotator.Y, None][turn.side()]
-    return self._rotate_half_cube(axis, turn.angle())
+    axis = [Rotator.X, Rotator.Y, Rotator.Z,
+            Rotator.X, Rotator.Y, Rotator.Z][turn.side()]
+    state = self._rotate_half_cube(axis, turn.angle())
+    if not turn.side() in Side.minimal_list():
+      state = state._rotate_cube(((axis, Turn.LAST - 1 - turn.angle()),))
+    return state
+
+  def _canonical_transpose(self):
+    Corners.init()
+    try:
+      return Corners.anchor(self._state)
+    except KeyError:
+      raise ValueError('not a valid cube state: %r' % (self,))
+
+  @staticmethod
+  def _sides(transpose):
+    return [transpose[side * Tile.LAST] // Tile.LAST
+            for side in range(Side.LAST)]
 
   def _rotate_cube(self, rotations):
     return State(Rotator.full_rotate(rotations, self._state))
@@ -141,11 +257,16 @@ class Rotator:
   def init():
     if hasattr(Rotator, '_initialized'):
       return
-    Rotator._full_transposes = \
-      {r: Rotator._full_rotation(r) for r in Rotator._FULL_ROTATIONS}
-    Rotator._half_transposes = \
-      {r: Rotator._half_rotation(r) for r in Rotator._HALF_ROTATIONS}
-    _initialized = True
+    (Rotator._full_transposes, Rotator._half_transposes) = \
+      Rotator._transposes(Rotator._do_rotate)
+    Rotator._initialized = True
+
+  # The same transposes as init() computes, derived with floating-point
+  # rotation matrices. Only meant for checking the exact ones; euclid is
+  # imported here so that solving never loads it.
+  @staticmethod
+  def geometric_transposes():
+    return Rotator._transposes(Rotator._do_geometric_rotate)
 
   @staticmethod
   def full_rotate(rotations, state):
@@ -155,6 +276,22 @@ class Rotator:
   def half_rotate(rotation, state):
     return Rotator._rotate(Rotator._half_transposes[rotation], state)
 
+  # Batch versions of the above for an (N, 24) array of states, one state
+  # per row. They need NumPy.
+  @staticmethod
+  def full_rotate_many(rotations, states):
+    return Rotator._rotate_many(Rotator._full_transposes[rotations], states)
+
+  @staticmethod
+  def half_rotate_many(rotation, states):
+    return Rotator._rotate_many(Rotator._half_transposes[rotation], states)
+
+  @staticmethod
+  def _rotate_many(transpose, states):
+    import numpy
+    return numpy.take(numpy.asarray(states, dtype=numpy.uint8), transpose,
+                      axis=1)
+
   @staticmethod
   def _rotate(transpose, state):
     result = list(state)
@@ -163,27 +300,48 @@ class Rotator:
     return result
 
   @staticmethod
-  def _full_rotation(rotations):
-    coords = Rotator._get_coords()
-    return Rotator._do_rotate(coords, rotations)
+  def _transposes(do_rotate):
+    full_transposes = {}
+    for rotations in Rotator._FULL_ROTATIONS:
+      coords = Rotator._get_coords()
+      full_transposes[rotations] = do_rotate(coords, rotations)
+    half_transposes = {}
+    for rotation in Rotator._HALF_ROTATIONS:
+      coords = Rotator._get_coords(positive_axis=rotation[0])
+      half_transposes[rotation] = do_rotate(coords, (rotation,))
+    return (full_transposes, half_transposes)
 
+  # Quarter turns by integer coordinate swaps: T90 is one quarter turn
+  # counterclockwise around the axis, T180 two and T270 three. As with
+  # matrices, the last rotation of the list is applied first.
   @staticmethod
-  def _half_rotation(rotation):
-    coords = Rotator._get_coords(positive_axis=rotation[0])
-    return Rotator._do_rotate(coords, (rotation,))
+  def _do_rotate(coords, rotations):
+    coords = list(coords)
+    for (axis, angle) in reversed(rotations):
+      (a, b) = ((axis + 1) % 3, (axis + 2) % 3)
+      for quarter in range(angle + 1):
+        for (pos, coord) in enumerate(coords):
+          coord = list(coord)
+          (coord[a], coord[b]) = (-coord[b], coord[a])
+          coords[pos] = tuple(coord)
+    return Rotator._create_transpose_from_coords(coords)
 
   @staticmethod
-  def _do_rotate(coords, rotations):
-    m = Matrix4()
+  def _do_geometric_rotate(coords, rotations):
+    import euclid
+    axes = (euclid.Vector3(1, 0, 0), euclid.Vector3(0, 1, 0),
+            euclid.Vector3(0, 0, 1))
+    m = euclid.Matrix4()
     for (axis, angle) in rotations:
-      m.rotate_axis(Turn.RADIANS[angle], Rotator._AXIS[axis])
+      m.rotate_axis(Turn.RADIANS[angle], axes[axis])
     points = map(lambda p: m * p, Rotator._coords_to_points(coords))
     return Rotator._create_transpose_from_coords(
       Rotator._points_to_coords(points))
 
   @staticmethod
   def _coords_to_points(coords):
-    return map(lambda coord: Point3(coord[0], coord[1], coord[2]), coords)
+    import euclid
+    return map(lambda c: euclid.Point3(c[0], c[1], c[2]), coords)
 
   @staticmethod
   def _points_to_coords(points):
@@ -202,13 +360,12 @@ class Rotator:
   @staticmethod
   def _create_transpose_from_coords(coords):
     positions = dict(zip(Rotator._COORDS, range(len(Rotator._COORDS))))
-    transpose = range(len(Rotator._COORDS))
+    transpose = list(range(len(Rotator._COORDS)))
     for (pos, coord) in enumerate(coords):
       if coord != (0, 0, 0):
         transpose[pos] = positions[coord]
     return tuple(transpose)
 
-  _AXIS = (Vector3(1, 0, 0), Vector3(0, 1, 0), Vector3(0, 0, 1))
   _COORDS = [
     (2, 1, 1), (2, 1, -1), (2, -1, -1), (2, -1, 1),
     (1, -2, 1), (1, -2, -1), (-1, -2, -1), (-1, -2, 1),
@@ -225,7 +382,7 @@ class Rotator:
     ((Y, Turn.T90),),
     ((Z, Turn.T180), (X, Turn.T90)),
     ((Z, Turn.T180),),
-    ((X, Turn.T270), (Z, Turn.T90)),
+    ((X, Turn.T90), (Y, Turn.T90)),
     ((Y, Turn.T90), (Z, Turn.T270)),
     ((Z, Turn.T90),),
     ((X, Turn.T270),),
@@ -249,60 +406,680 @@ class Rotator:
     (Z, Turn.T90), (Z, Turn.T180), (Z, Turn.T270)
   ]
 
+# Corner cubies are numbered by their home slot. The DLB slot is never
+# touched by F, U and R turns, so positions with the DLB cubie in place are
+# indexed by the permutation of the other 7 cubies (7! = 5040) and by the
+# twists of 6 of them (3^6 = 729), the last twist being implied.
+class Corners:
+  SLOTS = 8
+  PERMUTATIONS = 5040
+  ORIENTATIONS = 729
+  POSITIONS = PERMUTATIONS * ORIENTATIONS
+
+  @staticmethod
+  def init():
+    if hasattr(Corners, '_stickers'):
+      return
+    stickers = []
+    for slot in Corners._SLOTS:
+      by_axis = [None, None, None]
+      for (pos, coord) in enumerate(Rotator._COORDS):
+        if all((c > 0) == (s > 0) for (c, s) in zip(coord, slot)):
+          by_axis[[abs(c) for c in coord].index(2)] = pos
+      # Stickers go round the corner in the same direction for every slot,
+      # starting from the U/D one.
+      if slot[0] * slot[1] * slot[2] > 0:
+        stickers.append((by_axis[2], by_axis[0], by_axis[1]))
+      else:
+        stickers.append((by_axis[2], by_axis[1], by_axis[0]))
+    cubies = {}
+    for (cubie, positions) in enumerate(stickers):
+      colors = [pos // Tile.LAST for pos in positions]
+      for twist in range(3):
+        key = tuple(colors[(k - twist) % 3] for k in range(3))
+        cubies[key] = (cubie, twist)
+    Corners._colors = [[pos // Tile.LAST for pos in s] for s in stickers]
+    Corners._stickers = stickers
+    Corners._cubies = cubies
+    Rotator.init()
+    solved = [pos // Tile.LAST for pos in range(Side.LAST * Tile.LAST)]
+    (a, b, c) = stickers[-1]
+    anchors = [{} for slot in stickers]
+    dlb_sources = []
+    for rotation in Rotator._FULL_ROTATIONS:
+      transpose = Rotator._full_transposes[rotation]
+      sources = (transpose[a], transpose[b], transpose[c])
+      dlb_sources.append((transpose, sources))
+      for (slot, positions) in enumerate(stickers):
+        if sorted(positions) == sorted(sources):
+          key = tuple(solved[pos] for pos in stickers[-1])
+          anchors[slot][tuple(key[sources.index(pos)] for pos in positions)] = \
+            transpose
+    Corners._anchors = anchors
+    Corners._dlb_sources = dlb_sources
+    Corners._slots_to_anchor = list(reversed(list(enumerate(stickers))))
+
+  @staticmethod
+  def is_anchored(state):
+    (a, b, c) = Corners._stickers[-1]
+    return Corners._cubies.get((state[a], state[b], state[c])) == \
+      (Corners.SLOTS - 1, 0)
+
+  # Returns the transpose of the whole-cube rotation that moves the DLB
+  # cubie of the state home.
+  @staticmethod
+  def anchor(state):
+    for (slot, (a, b, c)) in Corners._slots_to_anchor:
+      anchor = Corners._anchors[slot].get((state[a], state[b], state[c]))
+      if anchor:
+        return anchor
+    raise KeyError('no DLB cubie')
+
+  # Raises ValueError unless the DLB cubie is in place and the state is one
+  # that turns can reach: every cubie in exactly one slot and the twists
+  # adding up to a multiple of 3.
+  @staticmethod
+  def index(state):
+    cubies = Corners._cubies
+    lower = Corners._LOWER_CUBIES
+    seen = 0
+    perm_index = 0
+    orient_index = 0
+    twists = 0
+    for (i, (a, b, c)) in enumerate(Corners._stickers[:-1]):
+      stickers = (state[a], state[b], state[c])
+      if not stickers in cubies:
+        raise ValueError('no corner cubie has colours %r' % (stickers,))
+      (cubie, twist) = cubies[stickers]
+      perm_index = perm_index * (7 - i) + cubie - lower[seen & ~(-1 << cubie)]
+      orient_index = orient_index * 3 + twist
+      twists += twist
+      seen |= 1 << cubie
+    if seen != (1 << (Corners.SLOTS - 1)) - 1 or \
+       not Corners.is_anchored(state):
+      raise ValueError('corner cubies missing or repeated')
+    if twists % 3 != 0:
+      raise ValueError('corner twists do not add up')
+    # The twist of the last slot is implied by the others.
+    return perm_index * Corners.ORIENTATIONS + orient_index // 3
+
+  # The cubie in each slot and its twist.
+  @staticmethod
+  def cubies(index):
+    (perm_index, orient_index) = divmod(index, Corners.ORIENTATIONS)
+    count = Corners.SLOTS - 1
+    digits = []
+    for i in range(count):
+      (perm_index, digit) = divmod(perm_index, i + 1)
+      digits.append(digit)
+    digits.reverse()
+    free = list(range(count))
+    perm = [free.pop(d) for d in digits] + [count]
+    twists = []
+    for i in range(count - 1):
+      (orient_index, twist) = divmod(orient_index, 3)
+      twists.append(twist)
+    twists.reverse()
+    twists += [-sum(twists) % 3, 0]
+    return (perm, twists)
+
+  @staticmethod
+  def stickers(index):
+    (perm, twists) = Corners.cubies(index)
+    result = [None] * (Side.LAST * Tile.LAST)
+    for (slot, positions) in enumerate(Corners._stickers):
+      colors = Corners._colors[perm[slot]]
+      for (k, pos) in enumerate(positions):
+        result[pos] = colors[(k - twists[slot]) % 3]
+    return result
+
+  _LOWER_CUBIES = [bin(i).count('1') for i in range(1 << 7)]
+  _SLOTS = [
+    (1, 1, 1), (1, 1, -1), (1, -1, -1), (1, -1, 1),
+    (-1, 1, 1), (-1, 1, -1), (-1, -1, 1), (-1, -1, -1)
+  ]
+
+# Per-coordinate move tables: the permutation and orientation parts of a
+# rank change independently under a turn, so applying move m (an index into
+# turns()) to a rank costs a lookup in each table.
+class MoveTables:
+  MOVES = 9
+
+  @staticmethod
+  def init(table_file=None):
+    if hasattr(MoveTables, 'perm'):
+      return
+    if table_file and 'perm_moves' in table_file.names():
+      MoveTables.perm = array('H', table_file.table('perm_moves'))
+      MoveTables.orient = array('H', table_file.table('orient_moves'))
+      return
+    turns = MoveTables.turns()
+    perm = array('H')
+    for p in range(Corners.PERMUTATIONS):
+      state = State.from_rank(p * Corners.ORIENTATIONS)
+      perm.extend(state.apply(t).to_rank() // Corners.ORIENTATIONS
+                  for t in turns)
+    orient = array('H')
+    for o in range(Corners.ORIENTATIONS):
+      state = State.from_rank(o)
+      orient.extend(state.apply(t).to_rank() % Corners.ORIENTATIONS
+                    for t in turns)
+    MoveTables.perm = perm
+    MoveTables.orient = orient
+
+  @staticmethod
+  def tables():
+    return [('perm_moves', MoveTables.perm),
+            ('orient_moves', MoveTables.orient)]
+
+  @staticmethod
+  def turns():
+    return Turn._TURNS[:MoveTables.MOVES]
+
+  @staticmethod
+  def apply(rank, move):
+    (perm, orient) = divmod(rank, Corners.ORIENTATIONS)
+    return MoveTables.perm[perm * MoveTables.MOVES + move] * \
+      Corners.ORIENTATIONS + MoveTables.orient[orient * MoveTables.MOVES + move]
+
+# The moves worth trying after each move, indexed by the 4 bit move code
+# VisitedRanks stores. Turning the face just turned again only reaches a
+# state one turn or none away from the previous one, so a search for
+# shortest paths never needs it. Any code above the moves, such as
+# VisitedRanks.NONE, is followed by all of them.
+MoveTables.SUCCESSORS = [
+  tuple(m for m in range(MoveTables.MOVES)
+        if last >= MoveTables.MOVES or m // 3 != last // 3)
+  for last in range(16)]
+
+# The 48 symmetries of the cube, the 24 rotations with and without a
+# mirror, each a sticker transpose with the renaming of colours that keeps
+# the solved state solved. Conjugating a position by one of them keeps its
+# distance. On ranks a symmetry is a table of where it takes each cubie and
+# twist of each slot, composed with each of the 24 rotations that can bring
+# the DLB cubie home afterwards.
+class Symmetries:
+  COUNT = 48
+
+  @staticmethod
+  def init():
+    if hasattr(Symmetries, '_symmetries'):
+      return
+    Corners.init()
+    slots = {}
+    for (slot, positions) in enumerate(Corners._stickers):
+      for pos in positions:
+        slots[pos] = slot
+    mirror = Rotator._create_transpose_from_coords(
+      [(-x, y, z) for (x, y, z) in Rotator._COORDS])
+    symmetries = []
+    for rotation in Rotator._FULL_ROTATIONS:
+      transpose = Rotator._full_transposes[rotation]
+      for t in (transpose, tuple(transpose[x] for x in mirror)):
+        symmetries.append((t, Symmetries._colors(t)))
+    anchors = [None] * (Corners.SLOTS * 3)
+    for (slot, transposes) in enumerate(Corners._anchors):
+      for (key, transpose) in transposes.items():
+        anchors[slot * 3 + Corners._cubies[key][1]] = \
+          Symmetries._cubie_moves(transpose, range(Color.LAST), slots)
+    conjugations = []
+    for (transpose, colors) in symmetries:
+      moves = Symmetries._cubie_moves(transpose, colors, slots)
+      source = [cubie for cubie in range(Corners.SLOTS)
+                if moves[cubie * 3][1] == Corners.SLOTS - 1][0]
+      anchored = [[anchor[(new_slot * Corners.SLOTS + cubie) * 3 + twist]
+                   for (new_slot, cubie, twist) in moves]
+                  for anchor in anchors]
+      conjugations.append((moves, source, anchored))
+    Symmetries._perms = [tuple(Corners.cubies(p * Corners.ORIENTATIONS)[0])
+                         for p in range(Corners.PERMUTATIONS)]
+    Symmetries._twists = [tuple(Corners.cubies(o)[1])
+                          for o in range(Corners.ORIENTATIONS)]
+    Symmetries._perm_indices = dict(
+      (perm[:-1], p) for (p, perm) in enumerate(Symmetries._perms))
+    Symmetries._conjugations = conjugations
+    Symmetries._symmetries = symmetries
+
+  # The ranks of the position of rank through each symmetry, in the order
+  # of State.conjugates. Its own rank comes first.
+  @staticmethod
+  def conjugates(rank):
+    Symmetries.init()
+    (perm, orient) = divmod(rank, Corners.ORIENTATIONS)
+    (cubies, twists) = (Symmetries._perms[perm], Symmetries._twists[orient])
+    result = []
+    for (moves, source, anchored) in Symmetries._conjugations:
+      slot = cubies.index(source)
+      (new_slot, _, twist) = \
+        moves[(slot * Corners.SLOTS + source) * 3 + twists[slot]]
+      result.append(
+        Symmetries._index(anchored[new_slot * 3 + twist], cubies, twists))
+    return result
+
+  # The smallest rank of the symmetry class of rank.
+  @staticmethod
+  def representative(rank):
+    return min(Symmetries.conjugates(rank))
+
+  @staticmethod
+  def _index(moves, cubies, twists):
+    new_cubies = [None] * Corners.SLOTS
+    new_twists = [None] * Corners.SLOTS
+    for (slot, cubie) in enumerate(cubies):
+      (new_slot, new_cubie, new_twist) = \
+        moves[(slot * Corners.SLOTS + cubie) * 3 + twists[slot]]
+      new_cubies[new_slot] = new_cubie
+      new_twists[new_slot] = new_twist
+    orient = 0
+    for twist in new_twists[:Corners.SLOTS - 2]:
+      orient = orient * 3 + twist
+    return Symmetries._perm_indices[tuple(new_cubies[:-1])] * \
+      Corners.ORIENTATIONS + orient
+
+  # Where the transpose and colour renaming take each cubie and twist of
+  # each slot, as (slot, cubie, twist) indexed by (slot * 8 + cubie) * 3 +
+  # twist.
+  @staticmethod
+  def _cubie_moves(transpose, colors, slots):
+    moves = [None] * (Corners.SLOTS * Corners.SLOTS * 3)
+    for (new_slot, positions) in enumerate(Corners._stickers):
+      slot = slots[transpose[positions[0]]]
+      offsets = [Corners._stickers[slot].index(transpose[pos])
+                 for pos in positions]
+      for (cubie, cubie_colors) in enumerate(Corners._colors):
+        for twist in range(3):
+          key = tuple(colors[cubie_colors[(k - twist) % 3]] for k in offsets)
+          moves[(slot * Corners.SLOTS + cubie) * 3 + twist] = \
+            (new_slot,) + Corners._cubies[key]
+    return moves
+
+  # The renaming of colours under which the transpose keeps the solved
+  # state solved.
+  @staticmethod
+  def _colors(transpose):
+    colors = [None] * Color.LAST
+    for (pos, x) in enumerate(transpose):
+      colors[x // Tile.LAST] = pos // Tile.LAST
+    return colors
+
+# The set of ranks met by a search, as a bitset, with the move that first
+# reached each of them packed two to a byte.
+class VisitedRanks:
+  NONE = 0xf
+
+  def __init__(self):
+    self._bits = bytearray((Corners.POSITIONS + 7) // 8)
+    self._moves = bytearray(b'\xff') * ((Corners.POSITIONS + 1) // 2)
+    self._count = 0
+
+  def add(self, rank, move):
+    self._bits[rank >> 3] |= 1 << (rank & 7)
+    shift = (rank & 1) << 2
+    self._moves[rank >> 1] = \
+      self._moves[rank >> 1] & (0xf0 >> shift) | move << shift
+    self._count += 1
+
+  def move(self, rank):
+    return self._moves[rank >> 1] >> ((rank & 1) << 2) & 0xf
+
+  # The moves that lead to rank from the rank added with NONE, one table
+  # lookup per move.
+  def path(self, rank):
+    MoveTables.init()
+    path = []
+    m = self.move(rank)
+    while m != VisitedRanks.NONE:
+      path.append(m)
+      rank = MoveTables.apply(rank, Turn.INVERSE[m])
+      m = self.move(rank)
+    path.reverse()
+    return path
+
+  def __contains__(self, rank):
+    return self._bits[rank >> 3] >> (rank & 7) & 1 == 1
+
+  def __len__(self):
+    return self._count
+
+# Distances to the solved state of each permutation and each orientation
+# coordinate alone. Both are lower bounds of the distance of a position.
+class PatternDatabases:
+  @staticmethod
+  def init():
+    if hasattr(PatternDatabases, 'perm'):
+      return
+    MoveTables.init()
+    PatternDatabases.perm = PatternDatabases._build(
+      MoveTables.perm, Corners.PERMUTATIONS)
+    PatternDatabases.orient = PatternDatabases._build(
+      MoveTables.orient, Corners.ORIENTATIONS)
+
+  @staticmethod
+  def _build(moves, size):
+    distances = bytearray([DistanceTable.UNKNOWN]) * size
+    distances[0] = 0
+    layer = [0]
+    depth = 0
+    while len(layer) > 0:
+      depth += 1
+      next_layer = []
+      for coord in layer:
+        for m in range(MoveTables.MOVES):
+          new_coord = moves[coord * MoveTables.MOVES + m]
+          if distances[new_coord] == DistanceTable.UNKNOWN:
+            distances[new_coord] = depth
+            next_layer.append(new_coord)
+      layer = next_layer
+    return distances
+
+# A sample of a running search, as passed to the observer of a Solver.
+class SearchProgress:
+  def __init__(self, depth, frontier_size, visited_count, generated_count,
+               elapsed):
+    self._depth = depth
+    self._frontier_size = frontier_size
+    self._visited_count = visited_count
+    self._generated_count = generated_count
+    self._elapsed = elapsed
+
+  # The number of moves between the layer being expanded and the state the
+  # search grows it from: the initial state, or the final one for the
+  # layers a bidirectional search grows from that end.
+  def depth(self):
+    return self._depth
+
+  def frontier_size(self):
+    return self._frontier_size
+
+  def visited_count(self):
+    return self._visited_count
+
+  def generated_count(self):
+    return self._generated_count
+
+  # Seconds since the search started, not counting building the tables.
+  def elapsed(self):
+    return self._elapsed
+
+  def states_per_second(self):
+    if self._elapsed <= 0:
+      return 0.0
+    return self._generated_count / self._elapsed
+
+  def __repr__(self):
+    return 'SearchProgress(depth=%d, frontier=%d, visited=%d, %.0f/s)' % (
+      self._depth, self._frontier_size, self._visited_count,
+      self.states_per_second())
+
+# Counts and times of a Solver run. The time is split between building the
+# move tables, the search (phase 1) and reading the solution back (phase
+# 2); with a distance table there is no search, and the walk down the
+# table is phase 2. Duplicates and probes follow from the other counts, so
+# keeping them costs the search nothing.
+class SolverStats:
+  PHASES = ('tables', 'phase1', 'phase2')
+
+  def __init__(self):
+    self._generated = 0
+    self._added = 0
+    self._probes = 0
+    self._visited = 0
+    self._max_frontier = 0
+    self._wall_times = dict((phase, 0.0) for phase in SolverStats.PHASES)
+    self._cpu_times = dict((phase, 0.0) for phase in SolverStats.PHASES)
+
+  def generated_count(self):
+    return self._generated
+
+  # Generated states that had been met before and were dropped.
+  def duplicate_count(self):
+    return self._generated - self._added
+
+  # Lookups of a rank in a set of visited ones. A rank stands for all the
+  # whole-cube rotations of a position, so each lookup is the equivalence
+  # test of a state against all those met.
+  def probe_count(self):
+    return self._probes
+
+  def visited_count(self):
+    return self._visited
+
+  # The size of the largest layer expanded.
+  def max_frontier_size(self):
+    return self._max_frontier
+
+  def wall_time(self, phase):
+    return self._wall_times[phase]
+
+  def cpu_time(self, phase):
+    return self._cpu_times[phase]
+
+  def as_dict(self):
+    stats = {
+      'generated': self._generated,
+      'duplicates': self.duplicate_count(),
+      'probes': self._probes,
+      'visited': self._visited,
+      'max_frontier': self._max_frontier,
+    }
+    for phase in SolverStats.PHASES:
+      stats[phase + '_wall_s'] = self._wall_times[phase]
+      stats[phase + '_cpu_s'] = self._cpu_times[phase]
+    return stats
+
+  # Writes the stats as a line of JSON, so that the lines of many runs can
+  # be appended to one file and aggregated.
+  def dump(self, file):
+    import json
+    file.write(json.dumps(self.as_dict(), sort_keys=True) + '\n')
+
+  def _time(self, phase, function):
+    (wall, cpu) = (time.time(), SolverStats._cpu_time())
+    try:
+      return function()
+    finally:
+      self._wall_times[phase] += time.time() - wall
+      self._cpu_times[phase] += SolverStats._cpu_time() - cpu
+
+  @staticmethod
+  def _cpu_time():
+    if hasattr(time, 'process_time'):
+      return time.process_time()
+    return time.clock()
+
 class Solver:
-  def __init__(self, initial_state, final_state=None):
-    if not final_state:
-      final_state = Solver.solved_state()
+  # The breadth-first search samples its progress every SAMPLE_RANKS ranks
+  # of a layer and at the end of each layer, when it has an observer.
+  SAMPLE_RANKS = 65536
+
+  # A final state other than the solved one is handled by solving
+  # initial_state.relative_to(final_state) instead, with the same tables.
+  # The observer, if any, is called with a SearchProgress now and then
+  # while a search runs. With a stats_file, each solve appends its stats()
+  # to it as a line of JSON.
+  def __init__(self, initial_state, final_state=None, distance_table=None,
+               bidirectional=False, cache=None, observer=None,
+               stats_file=None):
+    self._distance_table = distance_table
+    self._cache = cache
+    self._observer = observer
+    self._stats_file = stats_file
+    if final_state:
+      initial_state = initial_state.relative_to(final_state)
     self._initial_state = initial_state
-    self._final_state = final_state
-    self._known_states = {initial_state: None}
-    self._states_to_check = deque([initial_state])
+    self._bidirectional = bidirectional
+    self._visited = None
+    self._final_visited = None
+    self._generated = 0
+    self._max_frontier = 0
+    self._start_time = None
+    self._stats = SolverStats()
 
   def solve(self):
-    if not self._phase1():
+    self._generated = 0
+    self._max_frontier = 0
+    self._stats = SolverStats()
+    if self._cache is not None:
+      solution = self._cache.solve(self._initial_state, self._solve_uncached)
+    else:
+      solution = self._solve()
+    if self._stats_file is not None:
+      self._stats.dump(self._stats_file)
+    return solution
+
+  # The stats of the last solve. On a cache hit nothing is counted.
+  def stats(self):
+    return self._stats
+
+  def _solve(self):
+    stats = self._stats
+    stats._time('tables', MoveTables.init)
+    if self._distance_table:
+      return stats._time(
+        'phase2', lambda: self._distance_table.solve(self._initial_state))
+    if self._bidirectional:
+      rank = stats._time('phase1', self._bidirectional_phase1)
+      self._count()
+      if rank is None:
+        return None
+      return stats._time('phase2', lambda: self._bidirectional_phase2(rank))
+    found = stats._time('phase1', self._phase1)
+    self._count()
+    if not found:
       return None
-    return self._phase2()
+    return stats._time('phase2', self._phase2)
+
+  def _solve_uncached(self, state):
+    solver = Solver(state, distance_table=self._distance_table,
+                    bidirectional=self._bidirectional, observer=self._observer)
+    solution = solver.solve()
+    self._stats = solver.stats()
+    self._generated = solver.generated_count()
+    return solution
+
+  # Each generated rank is looked up in its own visited set, and in the
+  # bidirectional search each one added is then looked up in the other.
+  def _count(self):
+    stats = self._stats
+    visited = [v for v in (self._visited, self._final_visited) if v is not None]
+    stats._generated = self._generated
+    stats._visited = self.known_states_count()
+    stats._added = stats._visited - len(visited)
+    stats._probes = self._generated
+    if self._bidirectional:
+      stats._probes += stats._added
+    stats._max_frontier = self._max_frontier
+
+  def known_states_count(self):
+    return sum(len(visited) for visited in (self._visited, self._final_visited)
+               if visited is not None)
+
+  # The states produced by applying a move, whether new or not.
+  def generated_count(self):
+    return self._generated
+
+  # F, U and R turns keep the DLB cubie in place, so every state met by the
+  # search is the only one of its whole-cube rotations that can be met. With
+  # the colours renamed to put that cubie in place, which fixes the
+  # orientation once for the whole search, it runs on ranks.
+  def _ranks(self):
+    MoveTables.init()
+    return (self._initial_state.anchored().to_rank(),
+            Solver.solved_state().to_rank())
 
   def _phase1(self):
-    final_state_eqs = self._final_state.get_equivalents()
-    last_report_time = None
-    while len(self._states_to_check) > 0 and \
-          not self._find_known_state(final_state_eqs):
-      t = time.clock()
-      if not last_report_time or t - last_report_time >= 1.0:
-        last_report_time = t
-        print len(self._states_to_check)
-      state = self._states_to_check.popleft()
-      new_states_and_turns = self._generate_states_and_turns(state)
-      for (new_state, turn) in new_states_and_turns:
-        if self._find_known_state(new_state.get_equivalents()):
-          continue
-        self._known_states[new_state] = turn
-        self._states_to_check.append(new_state)
-    return self._find_known_state(final_state_eqs)
+    (initial_rank, final_rank) = self._ranks()
+    self._final_rank = final_rank
+    self._start_time = time.time()
+    (perm_moves, orient_moves) = (MoveTables.perm, MoveTables.orient)
+    successors = MoveTables.SUCCESSORS
+    self._visited = VisitedRanks()
+    self._visited.add(initial_rank, VisitedRanks.NONE)
+    layer = array('l', [initial_rank])
+    depth = 0
+    while len(layer) > 0 and not self._final_rank in self._visited:
+      self._max_frontier = max(self._max_frontier, len(layer))
+      next_layer = array('l')
+      # Without an observer the layer is a single chunk, so the loop over
+      # it checks nothing else.
+      chunks = [layer]
+      if self._observer:
+        chunks = (layer[first:first + Solver.SAMPLE_RANKS]
+                  for first in range(0, len(layer), Solver.SAMPLE_RANKS))
+      for chunk in chunks:
+        for rank in chunk:
+          (perm, orient) = divmod(rank, Corners.ORIENTATIONS)
+          perm *= MoveTables.MOVES
+          orient *= MoveTables.MOVES
+          moves = successors[self._visited.move(rank)]
+          self._generated += len(moves)
+          for m in moves:
+            new_rank = perm_moves[perm + m] * Corners.ORIENTATIONS + \
+              orient_moves[orient + m]
+            if new_rank in self._visited:
+              continue
+            self._visited.add(new_rank, m)
+            if new_rank == final_rank:
+              return True
+            next_layer.append(new_rank)
+        if self._observer:
+          self._report(depth, len(layer))
+      layer = next_layer
+      depth += 1
+    return self._final_rank in self._visited
 
   def _phase2(self):
-    state = self._find_known_state(self._final_state.get_equivalents())
-    path = []
-    while not self._initial_state in state.get_equivalents():
-      turn = self._known_states[state]
-      path.append(turn)
-      state = state.apply(turn.reverse())
-    path.reverse()
-    return path
-
-  def _generate_states_and_turns(self, state):
-    sides = Side.minimal_list()
-    angles = range(Turn.FIRST, Turn.LAST)
-    turns = [Turn(s, a) for s in sides for a in angles]
-    return [(state.apply(t), t) for t in turns]
+    turns = MoveTables.turns()
+    return [turns[m] for m in self._visited.path(self._final_rank)]
 
-  def _find_known_state(self, states):
-    for s in states:
-      if s in self._known_states:
-        return s
+  # Grows the smaller of the two frontiers by a whole layer at a time. The
+  # first rank reached from both ends lies on a shortest path: before the
+  # layer was expanded no path of its length or shorter existed.
+  def _bidirectional_phase1(self):
+    (initial_rank, final_rank) = self._ranks()
+    self._start_time = time.time()
+    self._visited = VisitedRanks()
+    self._visited.add(initial_rank, VisitedRanks.NONE)
+    self._final_visited = VisitedRanks()
+    self._final_visited.add(final_rank, VisitedRanks.NONE)
+    if initial_rank == final_rank:
+      return initial_rank
+    visited = (self._visited, self._final_visited)
+    frontiers = [array('l', [initial_rank]), array('l', [final_rank])]
+    depths = [0, 0]
+    while len(frontiers[0]) > 0 and len(frontiers[1]) > 0:
+      side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+      (own, other) = (visited[side], visited[1 - side])
+      self._max_frontier = max(self._max_frontier, len(frontiers[side]))
+      next_frontier = array('l')
+      for rank in frontiers[side]:
+        moves = MoveTables.SUCCESSORS[own.move(rank)]
+        self._generated += len(moves)
+        for m in moves:
+          new_rank = MoveTables.apply(rank, m)
+          if new_rank in own:
+            continue
+          own.add(new_rank, m)
+          if new_rank in other:
+            return new_rank
+          next_frontier.append(new_rank)
+      if self._observer:
+        self._report(depths[side], len(frontiers[side]))
+      frontiers[side] = next_frontier
+      depths[side] += 1
     return None
 
+  def _report(self, depth, frontier_size):
+    self._observer(SearchProgress(
+      depth, frontier_size, self.known_states_count(), self._generated,
+      time.time() - self._start_time))
+
+  def _bidirectional_phase2(self, rank):
+    moves = self._visited.path(rank) + [
+      Turn.INVERSE[m] for m in reversed(self._final_visited.path(rank))]
+    turns = MoveTables.turns()
+    return [turns[m] for m in moves]
+
   @staticmethod
   def solved_state():
     state_matrix = [c for c in range(Side.LAST) for t in range(Tile.LAST)]
@@ -310,6 +1087,397 @@ class Solver:
     assert state.verify()
     return state
 
+# A bounded cache of solutions, dropping the least recently used one when
+# full. Entries are keyed by rank, which the 24 whole-cube rotations of a
+# position share, and hold the solution of its canonical() state; a hit
+# turns the same sides as the caller sees them. The solutions given for the
+# exact states asked about are kept with the entry, so asking again skips
+# finding the rank.
+class SolutionCache:
+  def __init__(self, capacity=1024):
+    self._capacity = capacity
+    self._solutions = collections.OrderedDict()
+    self._inputs = {}
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+
+  # solve is called with the canonical() state on a miss.
+  def solve(self, state, solve):
+    entry = self._inputs.get(state._state)
+    if entry:
+      (rank, turns) = entry
+      self._solutions[rank] = self._solutions.pop(rank)
+      self._hits += 1
+      return None if turns is None else list(turns)
+    (canonical_state, rank, sides) = state.canonical_form()
+    if rank in self._solutions:
+      (solution, inputs) = self._solutions.pop(rank)
+      self._hits += 1
+    else:
+      self._misses += 1
+      solution = solve(canonical_state)
+      inputs = []
+      if len(self._solutions) >= self._capacity:
+        for key in self._solutions.popitem(last=False)[1][1]:
+          del self._inputs[key]
+        self._evictions += 1
+    turns = None
+    if solution is not None:
+      turns = tuple(Turn.remap(solution, sides))
+    inputs.append(state._state)
+    self._inputs[state._state] = (rank, turns)
+    self._solutions[rank] = (solution, inputs)
+    return None if turns is None else list(turns)
+
+  def hit_count(self):
+    return self._hits
+
+  def miss_count(self):
+    return self._misses
+
+  def eviction_count(self):
+    return self._evictions
+
+  def __len__(self):
+    return len(self._solutions)
+
+# Iterative-deepening A* over ranks, bounded by the pattern databases. Only
+# the current path is kept in memory.
+class IDAStarSolver:
+  def __init__(self, initial_state, final_state=None):
+    if final_state:
+      initial_state = initial_state.relative_to(final_state)
+    self._initial_state = initial_state
+    self._path = []
+    self._expanded = 0
+    self._generated = 0
+
+  def solve(self):
+    PatternDatabases.init()
+    rank = self._initial_state.anchored().to_rank()
+    (perm, orient) = divmod(rank, Corners.ORIENTATIONS)
+    bound = self._heuristic(perm, orient)
+    while bound is not None:
+      bound = self._search(perm, orient, 0, bound, VisitedRanks.NONE)
+      if bound == 0:
+        turns = MoveTables.turns()
+        return [turns[m] for m in self._path]
+    return None
+
+  def expanded_count(self):
+    return self._expanded
+
+  def generated_count(self):
+    return self._generated
+
+  @staticmethod
+  def _heuristic(perm, orient):
+    return max(PatternDatabases.perm[perm], PatternDatabases.orient[orient])
+
+  # Returns 0 when the solution is in self._path, otherwise the smallest
+  # cost above the bound met, or None when there is none.
+  def _search(self, perm, orient, depth, bound, last_move):
+    cost = depth + self._heuristic(perm, orient)
+    if cost > bound:
+      return cost
+    if perm == 0 and orient == 0:
+      return 0
+    self._expanded += 1
+    perm *= MoveTables.MOVES
+    orient *= MoveTables.MOVES
+    next_bound = None
+    moves = MoveTables.SUCCESSORS[last_move]
+    self._generated += len(moves)
+    for m in moves:
+      self._path.append(m)
+      result = self._search(MoveTables.perm[perm + m],
+                            MoveTables.orient[orient + m],
+                            depth + 1, bound, m)
+      if result == 0:
+        return 0
+      self._path.pop()
+      if result is not None and (next_bound is None or result < next_bound):
+        next_bound = result
+    return next_bound
+
+# Distances from the solved state for every position, indexed by rank.
+# Built once by a breadth-first search over the ranks; solving then only
+# needs to walk downhill.
+class DistanceTable:
+  UNKNOWN = 0xff
+
+  def __init__(self, distances):
+    self._distances = distances
+
+  @staticmethod
+  def build(max_depth=None):
+    MoveTables.init()
+    (perm_moves, orient_moves) = (MoveTables.perm, MoveTables.orient)
+    moves = range(MoveTables.MOVES)
+    distances = bytearray([DistanceTable.UNKNOWN]) * Corners.POSITIONS
+    solved = Solver.solved_state().to_rank()
+    distances[solved] = 0
+    layer = array('l', [solved])
+    depth = 0
+    while len(layer) > 0 and (max_depth is None or depth < max_depth):
+      depth += 1
+      next_layer = array('l')
+      for rank in layer:
+        (perm, orient) = divmod(rank, Corners.ORIENTATIONS)
+        perm *= MoveTables.MOVES
+        orient *= MoveTables.MOVES
+        for m in moves:
+          new_rank = perm_moves[perm + m] * Corners.ORIENTATIONS + \
+            orient_moves[orient + m]
+          if distances[new_rank] == DistanceTable.UNKNOWN:
+            distances[new_rank] = depth
+            next_layer.append(new_rank)
+      layer = next_layer
+    return DistanceTable(distances)
+
+  # Same as build, but expands each layer as a whole with NumPy: the 9
+  # turns of every rank in the layer are looked up at once in the move
+  # tables and the new ranks are deduplicated with numpy.unique.
+  @staticmethod
+  def build_vectorized(max_depth=None):
+    import numpy
+    MoveTables.init()
+    perm_moves = numpy.array(MoveTables.perm, dtype=numpy.int32).reshape(
+      Corners.PERMUTATIONS, MoveTables.MOVES)
+    orient_moves = numpy.array(MoveTables.orient, dtype=numpy.int32).reshape(
+      Corners.ORIENTATIONS, MoveTables.MOVES)
+    distances = numpy.empty(Corners.POSITIONS, dtype=numpy.uint8)
+    distances.fill(DistanceTable.UNKNOWN)
+    layer = numpy.array([Solver.solved_state().to_rank()], dtype=numpy.int32)
+    distances[layer] = 0
+    depth = 0
+    while layer.size > 0 and (max_depth is None or depth < max_depth):
+      depth += 1
+      (perm, orient) = numpy.divmod(layer, Corners.ORIENTATIONS)
+      ranks = (perm_moves[perm] * Corners.ORIENTATIONS +
+               orient_moves[orient]).ravel()
+      layer = numpy.unique(ranks[distances[ranks] == DistanceTable.UNKNOWN])
+      distances[layer] = depth
+    return DistanceTable(bytearray(distances.tobytes()))
+
+  @staticmethod
+  def load(path):
+    table_file = TableFile(path)
+    MoveTables.init(table_file)
+    return DistanceTable(table_file.table('distances'))
+
+  @staticmethod
+  def load_or_build(path):
+    if os.path.exists(path):
+      try:
+        return DistanceTable.load(path)
+      except (ValueError, KeyError, struct.error):
+        pass
+    try:
+      table = DistanceTable.build_vectorized()
+    except ImportError:
+      table = DistanceTable.build()
+    table.save(path)
+    return DistanceTable.load(path)
+
+  def save(self, path):
+    MoveTables.init()
+    TableFile.write(path,
+                    [('distances', self._distances)] + MoveTables.tables())
+
+  def distance(self, state):
+    distance = self._distances[state.to_rank()]
+    return None if distance == DistanceTable.UNKNOWN else distance
+
+  def solve(self, state):
+    distance = self.distance(state)
+    if distance is None:
+      return None
+    MoveTables.init()
+    turns = MoveTables.turns()
+    rank = state.anchored().to_rank()
+    path = []
+    while distance > 0:
+      for m in range(MoveTables.MOVES):
+        new_rank = MoveTables.apply(rank, m)
+        if self._distances[new_rank] == distance - 1:
+          break
+      path.append(turns[m])
+      rank = new_rank
+      distance -= 1
+    return path
+
+# A DistanceTable with one entry per class of positions under Symmetries:
+# the sorted representative ranks, each shifted left by 4 bits with the
+# distance of the class below.
+class SymmetricDistanceTable:
+  def __init__(self, classes):
+    self._classes = classes
+
+  # Expands one rank per class. A new rank marks its whole class as seen.
+  @staticmethod
+  def build(max_depth=None):
+    MoveTables.init()
+    Symmetries.init()
+    seen = VisitedRanks()
+    classes = array('I')
+    def add(rank, move, depth):
+      conjugates = Symmetries.conjugates(rank)
+      seen.add(rank, move)
+      for conjugate in conjugates:
+        if not conjugate in seen:
+          seen.add(conjugate, VisitedRanks.NONE)
+      classes.append(min(conjugates) << 4 | depth)
+    solved = Solver.solved_state().to_rank()
+    add(solved, VisitedRanks.NONE, 0)
+    layer = array('l', [solved])
+    depth = 0
+    while len(layer) > 0 and (max_depth is None or depth < max_depth):
+      depth += 1
+      next_layer = array('l')
+      for rank in layer:
+        for m in MoveTables.SUCCESSORS[seen.move(rank)]:
+          new_rank = MoveTables.apply(rank, m)
+          if not new_rank in seen:
+            add(new_rank, m, depth)
+            next_layer.append(new_rank)
+      layer = next_layer
+    return SymmetricDistanceTable(array('I', sorted(classes)))
+
+  @staticmethod
+  def load(path):
+    table_file = TableFile(path)
+    MoveTables.init(table_file)
+    return SymmetricDistanceTable(table_file.table('classes'))
+
+  def save(self, path):
+    MoveTables.init()
+    TableFile.write(path, [('classes', self._classes)] + MoveTables.tables())
+
+  def classes_count(self):
+    return len(self._classes)
+
+  def distance(self, state):
+    return self._distance(state.to_rank())
+
+  def solve(self, state):
+    distance = self.distance(state)
+    if distance is None:
+      return None
+    MoveTables.init()
+    turns = MoveTables.turns()
+    rank = state.anchored().to_rank()
+    path = []
+    while distance > 0:
+      for m in range(MoveTables.MOVES):
+        new_rank = MoveTables.apply(rank, m)
+        if self._distance(new_rank) == distance - 1:
+          break
+      path.append(turns[m])
+      rank = new_rank
+      distance -= 1
+    return path
+
+  def _distance(self, rank):
+    Symmetries.init()
+    key = Symmetries.representative(rank) << 4
+    i = bisect.bisect_left(self._classes, key)
+    if i == len(self._classes) or self._classes[i] >> 4 != key >> 4:
+      return None
+    return self._classes[i] & 0xf
+
+# Binary container for lookup tables. A header with the format version and
+# a directory of named sections, each holding a flat array of unsigned ints
+# and its CRC32, is followed by the page-aligned section data. Tables are
+# read through a copy-on-write mapping of the file, so processes using the
+# same file share its pages. A table stays valid for as long as it is
+# referenced.
+class TableFile:
+  MAGIC = b'R2X2TBL\0'
+  VERSION = 1
+
+  def __init__(self, path, verify=True):
+    with open(path, 'rb') as f:
+      self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    self._tables = {}
+    self._read_directory(verify)
+
+  def names(self):
+    return sorted(self._tables.keys())
+
+  def table(self, name):
+    if not name in self._tables:
+      raise KeyError('no table %r' % name)
+    return self._tables[name]
+
+  @staticmethod
+  def write(path, tables):
+    tables = [(name, TableFile._as_array(data)) for (name, data) in tables]
+    offset = TableFile._align(TableFile._HEADER.size +
+                              TableFile._ENTRY.size * len(tables))
+    entries = []
+    for (name, data) in tables:
+      size = len(data) * data.itemsize
+      entries.append(TableFile._ENTRY.pack(
+        name.encode('ascii'), data.typecode.encode('ascii'), offset, size,
+        zlib.crc32(data) & 0xffffffff))
+      offset = TableFile._align(offset + size)
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp_path, 'wb') as f:
+      f.write(TableFile._HEADER.pack(
+        TableFile.MAGIC, TableFile.VERSION, TableFile._byteorder(),
+        len(tables)))
+      for entry in entries:
+        f.write(entry)
+      for (entry, (name, data)) in zip(entries, tables):
+        f.seek(TableFile._ENTRY.unpack(entry)[2])
+        data.tofile(f)
+    os.rename(temp_path, path)
+
+  def _read_directory(self, verify):
+    (magic, version, byteorder, count) = \
+      TableFile._HEADER.unpack_from(self._map, 0)
+    if magic != TableFile.MAGIC:
+      raise ValueError('not a table file')
+    if version != TableFile.VERSION:
+      raise ValueError('unsupported table file version %d' % version)
+    if byteorder != TableFile._byteorder():
+      raise ValueError('table file has foreign byte order')
+    for i in range(count):
+      (name, typecode, offset, size, crc) = TableFile._ENTRY.unpack_from(
+        self._map, TableFile._HEADER.size + TableFile._ENTRY.size * i)
+      name = name.rstrip(b'\0').decode('ascii')
+      ctype = TableFile._CTYPES[typecode.rstrip(b'\0').decode('ascii')]
+      if offset + size > len(self._map):
+        raise ValueError('table %r is truncated' % name)
+      table = (ctype * (size // ctypes.sizeof(ctype))).from_buffer(
+        self._map, offset)
+      if verify and zlib.crc32(table) & 0xffffffff != crc:
+        raise ValueError('table %r is corrupted' % name)
+      self._tables[name] = table
+
+  @staticmethod
+  def _as_array(data):
+    if isinstance(data, bytearray):
+      return array('B', bytes(data))
+    if isinstance(data, array):
+      return data
+    return array(TableFile._TYPECODES[ctypes.sizeof(data._type_)], data)
+
+  @staticmethod
+  def _align(offset):
+    return (offset + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+
+  @staticmethod
+  def _byteorder():
+    return 0 if sys.byteorder == 'little' else 1
+
+  _HEADER = struct.Struct('<8sIII')
+  _ENTRY = struct.Struct('<16s4sQQI4x')
+  _CTYPES = {'B': ctypes.c_uint8, 'H': ctypes.c_uint16, 'I': ctypes.c_uint32}
+  _TYPECODES = {1: 'B', 2: 'H', 4: 'I'}
+
 if __name__ == '__main__':
   Rotator.init()
   _W = Color.WHITE
@@ -343,4 +1511,4 @@ if __name__ == '__main__':
   #   _B, _B, _G, _B  # DOWN
   # ])
   solver = Solver(initial_state, final_state)
-  print solver.solve()
+  print(solver.solve())
@@ -1,9 +1,27 @@
 #!/usr/bin/env python
 
+from array import array
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 
 from solver import *
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# euclid is written for Python 2 only.
+try:
+  import euclid
+except SyntaxError:
+  euclid = None
+
 class SolverTestCaseBase(unittest.TestCase):
   def setUp(self):
     Rotator.init()
@@ -53,6 +71,46 @@ class TurnReverseTestCase(SolverTestCaseBase):
     f2_turn = Turn(Side.FRONT, Turn.T180)
     assert initial_state.apply(f2_turn).apply(f2_turn.reverse()) == initial_state
 
+@unittest.skipIf(euclid is None, 'euclid does not load')
+class TransposesTestCase(SolverTestCaseBase):
+  def runTest(self):
+    full_transposes = Rotator._full_transposes
+    Rotator.init()
+    assert Rotator._full_transposes is full_transposes
+    assert Rotator.geometric_transposes() == \
+      (Rotator._full_transposes, Rotator._half_transposes)
+
+class LazyEuclidTestCase(SolverTestCaseBase):
+  def runTest(self):
+    statement = '; '.join([
+      'import sys',
+      'from solver import *',
+      'Rotator.init()',
+      'state = Solver.solved_state().apply(Turn(Side.FRONT, Turn.T90))',
+      'assert len(Solver(state).solve()) == 1',
+      'assert not "euclid" in sys.modules'])
+    directory = os.path.dirname(os.path.abspath(__file__))
+    assert subprocess.call([sys.executable, '-c', statement],
+                           cwd=directory) == 0
+
+class TurnCodeTestCase(SolverTestCaseBase):
+  def runTest(self):
+    assert [t.code() for t in MoveTables.turns()] == list(range(9))
+    assert MoveTables.turns() == [Turn(s, a) for s in Side.minimal_list()
+                                  for a in range(Turn.FIRST, Turn.LAST)]
+    for code in range(Turn.COUNT):
+      turn = Turn.from_code(code)
+      assert turn.code() == code
+      assert Turn.from_code(code) is turn
+      assert Turn(turn.side(), turn.angle()) == turn
+      assert turn.reverse() is Turn.from_code(Turn.INVERSE[code])
+      assert turn.reverse().reverse() is turn
+      assert turn.reverse().side() == turn.side()
+    assert Turn.INVERSE[:9] == [2, 1, 0, 5, 4, 3, 8, 7, 6]
+    assert Turn(Side.FRONT, Turn.T90) != Turn(Side.BACK, Turn.T90)
+    assert not Turn.from_code(0) == None and Turn.from_code(0) != None
+    assert not Turn.from_code(0) in [None, 0, 'F']
+
 class BasicTurnsTestCase(SolverTestCaseBase):
   def runTest(self):
     _W = Color.WHITE
@@ -158,6 +216,7 @@ class EquivalentsTestCase(SolverTestCaseBase):
     initial_state = Solver.solved_state()
     f_state = initial_state.apply(Turn(Side.FRONT, Turn.T90))
     f_eqs = f_state.get_equivalents()
+    assert len(set(f_eqs)) == 24
     assert f_state in f_eqs
     assert not initial_state in f_eqs
     f1_state = initial_state.apply(Turn(Side.FRONT, Turn.T270))
@@ -169,6 +228,24 @@ class EquivalentsTestCase(SolverTestCaseBase):
     assert f2_state in f2_eqs
     assert not initial_state in f2_eqs
 
+class CanonicalTestCase(SolverTestCaseBase):
+  def runTest(self):
+    initial_state = Solver.solved_state()
+    fu_state = initial_state.apply(
+      Turn(Side.FRONT, Turn.T90)).apply(Turn(Side.UPPER, Turn.T90))
+    assert fu_state.canonical() == fu_state
+    for rotation in Rotator._FULL_ROTATIONS:
+      state = State(Rotator.full_rotate(rotation, fu_state._state))
+      assert state.canonical() == fu_state
+      assert fu_state.aligned_to(state) == state
+      assert initial_state.aligned_to(state) in initial_state.get_equivalents()
+      (canonical_state, rank, sides) = state.canonical_form()
+      assert canonical_state == fu_state
+      assert rank == fu_state.to_rank()
+      for turn in MoveTables.turns():
+        (state_turn,) = Turn.remap([turn], sides)
+        assert state.apply(state_turn).canonical() == fu_state.apply(turn)
+
 class Simple1MoveTestCase(SolverTestCaseBase):
   def runTest(self):
     initial_state = Solver.solved_state()
@@ -192,5 +269,487 @@ class Simple2MovesTestCase(SolverTestCaseBase):
     assert result[1].side() == Side.FRONT
     assert result[1].angle() == Turn.T270
 
+class AnchoredTestCase(SolverTestCaseBase):
+  def runTest(self):
+    initial_state = Solver.solved_state()
+    f_state = initial_state.apply(Turn(Side.FRONT, Turn.T90))
+    assert f_state.anchored() == f_state
+    solved_states = initial_state.get_equivalents()
+    for state in f_state.get_equivalents():
+      anchored_state = state.anchored()
+      assert anchored_state.canonical() == anchored_state
+      for turn in MoveTables.turns():
+        assert (state.apply(turn) in solved_states) == \
+          (anchored_state.apply(turn) == initial_state)
+
+class RankTestCase(SolverTestCaseBase):
+  def runTest(self):
+    initial_state = Solver.solved_state()
+    assert initial_state.to_rank() == 0
+    assert State.from_rank(0) == initial_state
+    for rank in (1, 728, 729, 1234567, 3674159):
+      assert State.from_rank(rank).to_rank() == rank
+    ranks = set()
+    for side in Side.minimal_list():
+      for angle in range(Turn.FIRST, Turn.LAST):
+        state = initial_state.apply(Turn(side, angle))
+        ranks.add(state.to_rank())
+        assert State.from_rank(state.to_rank()) == state
+    assert len(ranks) == 9 and not 0 in ranks
+    fu_state = initial_state.apply(
+      Turn(Side.FRONT, Turn.T90)).apply(Turn(Side.UPPER, Turn.T90))
+    for state in fu_state.get_equivalents():
+      assert state.to_rank() == fu_state.to_rank()
+    self.assertRaises(ValueError, State.from_rank, 3674160)
+    self.assertRaises(ValueError, State([Color.WHITE] * 24).to_rank)
+    # A single twisted corner and a corner swapped for a copy of another
+    # have all the right colours but no rank.
+    Corners.init()
+    (a, b, c) = Corners._stickers[0]
+    (d, e, f) = Corners._stickers[1]
+    twisted = list(initial_state._state)
+    (twisted[a], twisted[b], twisted[c]) = (twisted[b], twisted[c], twisted[a])
+    repeated = list(initial_state._state)
+    (repeated[a], repeated[b], repeated[c]) = \
+      (repeated[d], repeated[e], repeated[f])
+    for stickers in (twisted, repeated):
+      state = State(stickers)
+      self.assertRaises(ValueError, state.to_rank)
+      self.assertRaises(ValueError, state.anchored().to_rank)
+
+class DistanceTableTestCase(SolverTestCaseBase):
+  def runTest(self):
+    table = DistanceTable.build(max_depth=3)
+    initial_state = Solver.solved_state()
+    assert table.distance(initial_state) == 0
+    assert table.solve(initial_state) == []
+    f_state = initial_state.apply(Turn(Side.FRONT, Turn.T90))
+    assert table.distance(f_state) == 1
+    fur_state = f_state.apply(
+      Turn(Side.UPPER, Turn.T90)).apply(Turn(Side.RIGHT, Turn.T180))
+    assert table.distance(fur_state) == 3
+    rotated_state = fur_state.get_equivalents()[5]
+    result = table.solve(rotated_state)
+    assert len(result) == 3
+    for turn in result:
+      rotated_state = rotated_state.apply(turn)
+    assert initial_state in rotated_state.get_equivalents()
+    result = table.solve(fur_state)
+    assert len(result) == 3
+    for turn in result:
+      fur_state = fur_state.apply(turn)
+    assert initial_state in fur_state.get_equivalents()
+    deep_state = fur_state.apply(
+      Turn(Side.FRONT, Turn.T90)).apply(Turn(Side.UPPER, Turn.T90)).apply(
+      Turn(Side.RIGHT, Turn.T90)).apply(Turn(Side.FRONT, Turn.T90))
+    assert table.distance(deep_state) is None
+    assert table.solve(deep_state) is None
+    solver = Solver(f_state.apply(Turn(Side.UPPER, Turn.T90)),
+                    distance_table=table)
+    result = solver.solve()
+    assert len(result) == 2
+    assert result[0].side() == Side.UPPER
+    assert result[1].side() == Side.FRONT
+
+class SymmetriesTestCase(SolverTestCaseBase):
+  def runTest(self):
+    initial_state = Solver.solved_state()
+    solved = initial_state.to_rank()
+    assert Symmetries.conjugates(solved) == [solved] * Symmetries.COUNT
+    state = initial_state
+    for turn in (Turn(Side.FRONT, Turn.T90), Turn(Side.UPPER, Turn.T270),
+                 Turn(Side.RIGHT, Turn.T180)):
+      state = state.apply(turn)
+    conjugates = state.conjugates()
+    assert len(set(conjugates)) == Symmetries.COUNT
+    assert Symmetries.conjugates(state.to_rank()) == \
+      [conjugate.to_rank() for conjugate in conjugates]
+    assert Symmetries.conjugates(state.to_rank())[0] == state.to_rank()
+    table = DistanceTable.build(max_depth=3)
+    assert all(table.distance(conjugate) == 3 for conjugate in conjugates)
+    for rank in (1, 728, 729, 1234567, 3674159):
+      conjugates = State.from_rank(rank).conjugates()
+      assert Symmetries.conjugates(rank) == \
+        [conjugate.to_rank() for conjugate in conjugates]
+      assert Symmetries.representative(rank) <= rank
+
+class SymmetricDistanceTableTestCase(SolverTestCaseBase):
+  def setUp(self):
+    SolverTestCaseBase.setUp(self)
+    self._dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self._dir)
+
+  def runTest(self):
+    table = SymmetricDistanceTable.build(max_depth=3)
+    full_table = DistanceTable.build(max_depth=3)
+    assert table.classes_count() < 385
+    assert sum(len(set(Symmetries.conjugates(c >> 4)))
+               for c in table._classes) == 1 + 9 + 54 + 321
+    initial_state = Solver.solved_state()
+    assert table.distance(initial_state) == 0
+    assert table.solve(initial_state) == []
+    state = initial_state
+    for turn in (Turn(Side.RIGHT, Turn.T90), Turn(Side.FRONT, Turn.T180),
+                 Turn(Side.UPPER, Turn.T90), Turn(Side.RIGHT, Turn.T90)):
+      assert table.distance(state) == full_table.distance(state)
+      state = state.apply(turn)
+    assert table.distance(state) is None
+    assert table.solve(state) is None
+    path = os.path.join(self._dir, 'classes.bin')
+    table.save(path)
+    table = SymmetricDistanceTable.load(path)
+    fur_state = initial_state.apply(Turn(Side.FRONT, Turn.T90)).apply(
+      Turn(Side.UPPER, Turn.T90)).apply(Turn(Side.RIGHT, Turn.T180))
+    for state in fur_state.conjugates()[::7] + fur_state.get_equivalents()[::5]:
+      result = Solver(state, distance_table=table).solve()
+      assert len(result) == 3
+      for turn in result:
+        state = state.apply(turn)
+      assert initial_state in state.get_equivalents()
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class VectorizedDistanceTableTestCase(SolverTestCaseBase):
+  def runTest(self):
+    table = DistanceTable.build(max_depth=4)
+    vectorized_table = DistanceTable.build_vectorized(max_depth=4)
+    assert vectorized_table._distances == table._distances
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class RotateManyTestCase(SolverTestCaseBase):
+  def runTest(self):
+    states = [State.from_rank(rank)._state for rank in (0, 5, 1234567)]
+    batch = numpy.array(states, dtype=numpy.uint8)
+    for rotation in Rotator._HALF_ROTATIONS:
+      rotated = Rotator.half_rotate_many(rotation, batch)
+      assert rotated.dtype == numpy.uint8
+      assert [tuple(row) for row in rotated] == \
+        [tuple(Rotator.half_rotate(rotation, s)) for s in states]
+    for rotation in Rotator._FULL_ROTATIONS:
+      rotated = Rotator.full_rotate_many(rotation, states)
+      assert [tuple(row) for row in rotated] == \
+        [tuple(Rotator.full_rotate(rotation, s)) for s in states]
+
+class MoveTablesTestCase(SolverTestCaseBase):
+  def runTest(self):
+    MoveTables.init()
+    assert len(MoveTables.perm) == 5040 * 9
+    assert len(MoveTables.orient) == 729 * 9
+    turns = MoveTables.turns()
+    for rank in (0, 1, 728, 729, 1234567, 3674159):
+      state = State.from_rank(rank)
+      for (m, turn) in enumerate(turns):
+        assert MoveTables.apply(rank, m) == state.apply(turn).to_rank()
+
+class MoveSuccessorsTestCase(SolverTestCaseBase):
+  def runTest(self):
+    assert MoveTables.SUCCESSORS[VisitedRanks.NONE] == tuple(range(9))
+    for last in range(MoveTables.MOVES):
+      successors = MoveTables.SUCCESSORS[last]
+      assert len(successors) == 6
+      assert all(m // 3 != last // 3 for m in successors)
+    initial_state = Solver.solved_state()
+    state = initial_state.apply(Turn(Side.FRONT, Turn.T90))
+    solver = Solver(state)
+    assert len(solver.solve()) == 1
+    assert solver.generated_count() == 9
+    state = state.apply(Turn(Side.UPPER, Turn.T90))
+    solver = Solver(state)
+    assert len(solver.solve()) == 2
+    # The search stops at the goal, from the 6th of the 9 states of depth 1.
+    assert solver.generated_count() == 9 + 6 * 6
+    solver = Solver(state, bidirectional=True)
+    assert len(solver.solve()) == 2
+    assert 0 < solver.generated_count() <= 9 + 9 * 6
+
+class VisitedRanksTestCase(SolverTestCaseBase):
+  def runTest(self):
+    visited = VisitedRanks()
+    assert len(visited) == 0
+    for (rank, move) in ((0, VisitedRanks.NONE), (1, 8), (2, 0), (3674159, 5)):
+      assert not rank in visited
+      visited.add(rank, move)
+      assert rank in visited
+      assert visited.move(rank) == move
+    assert visited.move(0) == VisitedRanks.NONE
+    assert visited.move(1) == 8
+    assert len(visited) == 4
+    assert not 3674158 in visited
+    MoveTables.init()
+    visited = VisitedRanks()
+    visited.add(0, VisitedRanks.NONE)
+    rank = 0
+    for m in (0, 4, 8, 1):
+      rank = MoveTables.apply(rank, m)
+      visited.add(rank, m)
+    assert visited.path(rank) == [0, 4, 8, 1]
+    assert visited.path(0) == []
+
+class TableFileTestCase(SolverTestCaseBase):
+  def setUp(self):
+    SolverTestCaseBase.setUp(self)
+    self._dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self._dir)
+
+  def runTest(self):
+    path = os.path.join(self._dir, 'tables.bin')
+    TableFile.write(path, [('moves', array('H', [1, 2, 65535])),
+                           ('distances', bytearray([0, 1, 2, 0xff]))])
+    table_file = TableFile(path)
+    assert table_file.names() == ['distances', 'moves']
+    assert list(table_file.table('moves')) == [1, 2, 65535]
+    assert list(table_file.table('distances')) == [0, 1, 2, 0xff]
+    self.assertRaises(KeyError, table_file.table, 'pruning')
+    with open(path, 'r+b') as f:
+      f.seek(-1, os.SEEK_END)
+      f.write(b'\0')
+    self.assertRaises(ValueError, TableFile, path)
+    TableFile(path, verify=False)
+    with open(path, 'r+b') as f:
+      f.write(b'garbage')
+    self.assertRaises(ValueError, TableFile, path)
+    table = DistanceTable.build(max_depth=2)
+    table.save(path)
+    loaded = DistanceTable.load(path)
+    f_state = Solver.solved_state().apply(Turn(Side.FRONT, Turn.T90))
+    assert loaded.distance(f_state) == 1
+    assert len(loaded.solve(f_state)) == 1
+
+class RotatedStatesTestCase(SolverTestCaseBase):
+  def runTest(self):
+    initial_state = Solver.solved_state()
+    fu_state = initial_state.apply(
+      Turn(Side.FRONT, Turn.T90)).apply(Turn(Side.UPPER, Turn.T90))
+    for state in fu_state.get_equivalents():
+      result = Solver(state).solve()
+      assert len(result) == 2
+      for turn in result:
+        state = state.apply(turn)
+      assert initial_state in state.get_equivalents()
+    f_state = initial_state.apply(Turn(Side.FRONT, Turn.T90))
+    result = Solver(fu_state, f_state.get_equivalents()[7]).solve()
+    assert len(result) == 1
+    assert result[0].side() == Side.UPPER
+    assert result[0].angle() == Turn.T270
+
+class BidirectionalTestCase(SolverTestCaseBase):
+  def runTest(self):
+    initial_state = Solver.solved_state()
+    assert Solver(initial_state, bidirectional=True).solve() == []
+    state = initial_state
+    for turn in (Turn(Side.FRONT, Turn.T90), Turn(Side.UPPER, Turn.T90),
+                 Turn(Side.RIGHT, Turn.T180), Turn(Side.FRONT, Turn.T270),
+                 Turn(Side.UPPER, Turn.T180)):
+      state = state.apply(turn)
+    solver = Solver(state, bidirectional=True)
+    result = solver.solve()
+    assert len(result) == 5
+    assert solver.known_states_count() < 1000
+    for turn in result:
+      state = state.apply(turn)
+    assert initial_state in state.get_equivalents()
+    f_state = initial_state.apply(Turn(Side.FRONT, Turn.T90))
+    fu_state = f_state.apply(Turn(Side.UPPER, Turn.T90))
+    rotated_state = f_state.get_equivalents()[7]
+    result = Solver(fu_state, rotated_state, bidirectional=True).solve()
+    assert len(result) == 1
+    assert result[0].side() == Side.UPPER
+    assert result[0].angle() == Turn.T270
+
+class ObserverTestCase(SolverTestCaseBase):
+  def runTest(self):
+    state = Solver.solved_state()
+    for turn in (Turn(Side.FRONT, Turn.T90), Turn(Side.UPPER, Turn.T90),
+                 Turn(Side.RIGHT, Turn.T180)):
+      state = state.apply(turn)
+    samples = []
+    sample_ranks = Solver.SAMPLE_RANKS
+    Solver.SAMPLE_RANKS = 10
+    try:
+      solver = Solver(state, observer=samples.append)
+      assert len(solver.solve()) == 3
+    finally:
+      Solver.SAMPLE_RANKS = sample_ranks
+    # One sample for each chunk of at most 10 ranks of each layer: the
+    # root, the 9 states of depth 1 and the 54 of depth 2, up to the chunk
+    # in which the goal is found.
+    assert [sample.depth() for sample in samples] == [0, 1] + [2] * 4
+    assert [sample.frontier_size() for sample in samples] == [1, 9] + [54] * 4
+    for (previous, sample) in zip(samples, samples[1:]):
+      assert previous.generated_count() < sample.generated_count()
+      assert previous.visited_count() < sample.visited_count()
+      assert previous.elapsed() <= sample.elapsed()
+    assert samples[-1].generated_count() < solver.generated_count()
+    assert samples[-1].states_per_second() >= 0
+    samples = []
+    assert len(Solver(state, bidirectional=True,
+                      observer=samples.append).solve()) == 3
+    # A layer of depth 0 from each end.
+    assert [sample.depth() for sample in samples] == [0, 0]
+    assert [sample.frontier_size() for sample in samples] == [1, 1]
+    for turn in (Turn(Side.FRONT, Turn.T270), Turn(Side.UPPER, Turn.T180)):
+      state = state.apply(turn)
+    samples = []
+    assert len(Solver(state, bidirectional=True,
+                      observer=samples.append).solve()) == 5
+    assert [sample.depth() for sample in samples] == [0, 0, 1, 1]
+    assert [sample.frontier_size() for sample in samples] == [1, 1, 9, 9]
+
+class StatsTestCase(SolverTestCaseBase):
+  def runTest(self):
+    state = Solver.solved_state()
+    for turn in (Turn(Side.FRONT, Turn.T90), Turn(Side.UPPER, Turn.T90),
+                 Turn(Side.RIGHT, Turn.T180)):
+      state = state.apply(turn)
+    directory = tempfile.mkdtemp()
+    try:
+      path = os.path.join(directory, 'stats.jsonl')
+      with open(path, 'w') as stats_file:
+        solvers = [Solver(state, stats_file=stats_file),
+                   Solver(state, bidirectional=True, stats_file=stats_file)]
+        for solver in solvers:
+          assert len(solver.solve()) == 3
+      with open(path) as stats_file:
+        lines = [json.loads(line) for line in stats_file]
+    finally:
+      shutil.rmtree(directory)
+    assert lines == [solver.stats().as_dict() for solver in solvers]
+    # Solving again counts the second solve alone.
+    for solver in (Solver(state), Solver(state, bidirectional=True)):
+      solver.solve()
+      (stats, generated) = (solver.stats(), solver.generated_count())
+      solver.solve()
+      assert solver.generated_count() == generated
+      assert solver.stats().generated_count() == stats.generated_count()
+      assert solver.stats().max_frontier_size() == stats.max_frontier_size()
+      assert solver.stats().duplicate_count() == stats.duplicate_count()
+    (stats, bidirectional_stats) = [solver.stats() for solver in solvers]
+    # The layers of depth 0 and 1 have 1 and 9 states, and the goal is
+    # found from the 48th of the 54 of depth 2.
+    assert stats.generated_count() == solvers[0].generated_count()
+    assert stats.generated_count() == 9 + 9 * 6 + 48 * 6
+    assert stats.visited_count() == solvers[0].known_states_count()
+    assert stats.duplicate_count() == \
+      stats.generated_count() - (stats.visited_count() - 1)
+    assert stats.probe_count() == stats.generated_count()
+    assert stats.max_frontier_size() == 54
+    assert bidirectional_stats.probe_count() == \
+      bidirectional_stats.generated_count() + \
+      bidirectional_stats.visited_count() - 2
+    for phase in SolverStats.PHASES:
+      assert stats.wall_time(phase) >= 0
+      assert stats.cpu_time(phase) >= 0
+    assert stats.wall_time('phase1') > 0
+    table = DistanceTable.build(max_depth=3)
+    # Building the move tables is timed apart from walking the table.
+    (perm, orient) = (MoveTables.perm, MoveTables.orient)
+    del MoveTables.perm
+    try:
+      solver = Solver(state, distance_table=table)
+      solver.solve()
+    finally:
+      (MoveTables.perm, MoveTables.orient) = (perm, orient)
+    assert solver.stats().generated_count() == 0
+    assert solver.stats().wall_time('phase1') == 0
+    assert solver.stats().wall_time('phase2') > 0
+    assert solver.stats().wall_time('tables') > \
+      solver.stats().wall_time('phase2')
+
+class RelativeTestCase(SolverTestCaseBase):
+  def runTest(self):
+    initial_state = Solver.solved_state()
+    final_state = initial_state
+    for turn in (Turn(Side.RIGHT, Turn.T90), Turn(Side.UPPER, Turn.T270),
+                 Turn(Side.FRONT, Turn.T180), Turn(Side.RIGHT, Turn.T90)):
+      final_state = final_state.apply(turn)
+    assert final_state.relative_to(final_state) == initial_state
+    state = final_state
+    for turn in (Turn(Side.UPPER, Turn.T90), Turn(Side.FRONT, Turn.T270),
+                 Turn(Side.RIGHT, Turn.T180)):
+      state = state.apply(turn)
+    state = state.get_equivalents()[11]
+    final_state = final_state.get_equivalents()[3]
+    table = DistanceTable.build(max_depth=3)
+    for solver in (Solver(state, final_state, distance_table=table),
+                   Solver(state, final_state),
+                   Solver(state, final_state, bidirectional=True),
+                   IDAStarSolver(state, final_state)):
+      result = solver.solve()
+      assert len(result) == 3
+      result_state = state
+      for turn in result:
+        result_state = result_state.apply(turn)
+      assert final_state in result_state.get_equivalents()
+    self.assertRaises(ValueError, state.relative_to,
+                      State([Color.WHITE] * 24))
+
+class FarSideTurnsTestCase(SolverTestCaseBase):
+  def runTest(self):
+    state = Solver.solved_state()
+    for turn in (Turn(Side.RIGHT, Turn.T90), Turn(Side.UPPER, Turn.T270),
+                 Turn(Side.FRONT, Turn.T180)):
+      state = state.apply(turn)
+    for (side, near_side) in ((Side.BACK, Side.FRONT), (Side.DOWN, Side.UPPER),
+                              (Side.LEFT, Side.RIGHT)):
+      near = slice(near_side * Tile.LAST, (near_side + 1) * Tile.LAST)
+      for angle in range(Turn.FIRST, Turn.LAST):
+        turn = Turn(side, angle)
+        far_state = state.apply(turn)
+        assert far_state._state[near] == state._state[near]
+        near_state = state.apply(Turn(near_side, angle))
+        assert far_state in near_state.get_equivalents()
+        assert far_state.apply(turn.reverse()) == state
+
+class SolutionCacheTestCase(SolverTestCaseBase):
+  def runTest(self):
+    table = DistanceTable.build(max_depth=3)
+    cache = SolutionCache(capacity=2)
+    initial_state = Solver.solved_state()
+    state = initial_state
+    for turn in (Turn(Side.RIGHT, Turn.T90), Turn(Side.UPPER, Turn.T270),
+                 Turn(Side.FRONT, Turn.T180)):
+      state = state.apply(turn)
+    for rotated_state in state.get_equivalents() * 2:
+      result = Solver(rotated_state, distance_table=table, cache=cache).solve()
+      assert len(result) == 3
+      for turn in result:
+        rotated_state = rotated_state.apply(turn)
+      assert initial_state in rotated_state.get_equivalents()
+    assert cache.miss_count() == 1
+    assert cache.hit_count() == 47
+    assert len(cache) == 1
+    f_state = initial_state.apply(Turn(Side.FRONT, Turn.T90))
+    deep_state = state.apply(Turn(Side.UPPER, Turn.T90))
+    assert len(Solver(f_state, distance_table=table, cache=cache).solve()) == 1
+    assert Solver(deep_state, distance_table=table, cache=cache).solve() is None
+    assert Solver(deep_state, distance_table=table, cache=cache).solve() is None
+    assert (cache.miss_count(), cache.eviction_count()) == (3, 1)
+    assert len(cache) == 2
+    assert len(Solver(state, distance_table=table, cache=cache).solve()) == 3
+    assert (cache.miss_count(), cache.eviction_count()) == (4, 2)
+
+class IDAStarTestCase(SolverTestCaseBase):
+  def runTest(self):
+    initial_state = Solver.solved_state()
+    assert IDAStarSolver(initial_state).solve() == []
+    state = initial_state
+    for turn in (Turn(Side.RIGHT, Turn.T90), Turn(Side.UPPER, Turn.T270),
+                 Turn(Side.FRONT, Turn.T180), Turn(Side.RIGHT, Turn.T270),
+                 Turn(Side.UPPER, Turn.T90), Turn(Side.FRONT, Turn.T90)):
+      state = state.apply(turn)
+    expected = len(Solver(state, bidirectional=True).solve())
+    for rotated_state in (state, state.get_equivalents()[9]):
+      solver = IDAStarSolver(rotated_state)
+      result = solver.solve()
+      assert len(result) == expected
+      assert solver.expanded_count() > 0
+      assert solver.generated_count() < 9 * solver.expanded_count()
+      for turn in result:
+        rotated_state = rotated_state.apply(turn)
+      assert initial_state in rotated_state.get_equivalents()
+
 if __name__ == "__main__":
   unittest.main()